@@ -1,11 +1,13 @@
 import numpy as np
+import threading
 import tkinter as tk
 from tkinter import font
 from tkinter import messagebox, filedialog
 from PIL import ImageTk, Image
 from pathlib import Path
 from sudoku_extrapolation import extrapolate_sudoku
-from sudoku_solver import solve_sudoku
+from sudoku_model_registry import registry
+from sudoku_solver import solve_sudoku_steps, find_conflicts
 
 
 class sudoku_gui(tk.Tk):
@@ -172,11 +174,18 @@ class one_CNN(tk.Frame, _variables):
     def __init_model1(self):
         '''Initialize the variable for the selected model with the first one'''
         _variables.selected_model = "sudoku_model/model_sudoku.hdf5"
+        self.__warm_up_model()
 
 
     def __init_model2(self):
         '''Initialize the variable for the selected model with the second one'''
         _variables.selected_model = "sudoku_model/model_sudoku_mnist.hdf5"
+        self.__warm_up_model()
+
+
+    def __warm_up_model(self):
+        '''Load the selected model in the background while the user chooses an image, so that the extraction does not wait for it'''
+        threading.Thread(target=registry('numpy').warm_up, args=(_variables.selected_model,), daemon=True).start()
 
 
 
@@ -194,6 +203,8 @@ class two_grid(tk.Frame, _variables):
         self.image_path = ''
         self.previous_image_path = ''
         self.control_var = 0
+        # the decoded image, turned as the user wants, shown in the page and given to the extraction
+        self.image = None
         self.img = ''
         self.cell_font = font.Font(family='Helvetica', size=12)
 
@@ -307,18 +318,10 @@ class two_grid(tk.Frame, _variables):
 
         if filename:
             self.image_path = filename
-            img = Image.open(filename)
-            img = self.__reorient_image(img)
-            width, height = img.size
-            if width < height:
-                img = img.resize((340, 456), Image.ANTIALIAS)
-            elif width > height:
-                img = img.resize((456, 340), Image.ANTIALIAS)
-            else:
-                img = img.resize((340, 340), Image.ANTIALIAS)
-            img = ImageTk.PhotoImage(img)
-            self.img = img
-            self.im_label.configure(image=img)
+            # the file is decoded only here, loading the image closes it
+            self.image = self.__reorient_image(Image.open(filename))
+            self.image.load()
+            self.__show_image()
             messagebox.showinfo(title='File uploaded successfully', message=f"Image has been successfully uploaded from '{filename}'. "
                                 "Click on 'Fill the grid with the sudoku' to proceed. It may take a few seconds. Then click on 'Continue'.")
 
@@ -349,18 +352,20 @@ class two_grid(tk.Frame, _variables):
 
 
     def __rotate_image(self):
-        '''Rotate and save an image by 90 degrees in clockwise direction'''
-        path = self.image_path
-        im = Image.open(path)
-        rot = im.rotate(270, resample=Image.BICUBIC, expand=True)
-        rot.save(path, quality=95, subsampling=0)
-        width, height = rot.size
+        '''Rotate the image in memory by 90 degrees in clockwise direction, without changing its file'''
+        self.image = self.image.transpose(Image.ROTATE_270)
+        self.__show_image()
+
+
+    def __show_image(self):
+        '''Display a reduced copy of the image'''
+        width, height = self.image.size
         if width < height:
-            img = rot.resize((340, 456), Image.ANTIALIAS)
+            img = self.image.resize((340, 456), Image.LANCZOS)
         elif width > height:
-            img = rot.resize((456, 340), Image.ANTIALIAS)
+            img = self.image.resize((456, 340), Image.LANCZOS)
         else:
-            img = rot.resize((340, 340), Image.ANTIALIAS)
+            img = self.image.resize((340, 340), Image.LANCZOS)
         img = ImageTk.PhotoImage(img)
         self.img = img
         self.im_label.configure(image=img)
@@ -466,6 +471,7 @@ class two_grid(tk.Frame, _variables):
     def __reset_image_path(self):
         '''Reset the path of the image'''
         self.image_path = ''
+        self.image = None
 
     
     def __manage_numbers_and_buttons(self):
@@ -508,7 +514,7 @@ class two_grid(tk.Frame, _variables):
     
     def __extrapolate_sudoku(self):
         '''Extrapolate the sudoku numbers from an image using the appropriate function'''
-        my_sudoku_grid = extrapolate_sudoku(self.image_path, _variables.selected_model)
+        my_sudoku_grid = extrapolate_sudoku(np.asarray(self.image.convert('L')), _variables.selected_model)
         self.sudoku_grid = np.copy(my_sudoku_grid)
 
         if (my_sudoku_grid == np.zeros((9, 9), np.int8)).all():
@@ -540,6 +546,9 @@ class three_solution(tk.Frame, _variables):
         self.sudoku_grid_corrected = np.zeros(shape=(9,9), dtype=np.int8)
         self.solved_sudoku_grid = np.zeros(shape=(9,9), dtype=np.int8)
         self.cell_font = font.Font(family='Helvetica', size=12)
+        # the running search and the id of its next step scheduled with after()
+        self.steps = None
+        self.solving = None
 
         # frame's title label
         label = tk.Label(self, text="Solve the sudoku puzzle", font=controller.subtitle_font)
@@ -563,7 +572,8 @@ class three_solution(tk.Frame, _variables):
 
         # button to return to the second frame
         return_button = tk.Button(self, text="Return", font=controller.button_font,
-                            command=lambda: [controller.show_frame("two_grid"),
+                            command=lambda: [self.__stop_solving(),
+                            controller.show_frame("two_grid"),
                             reset_button.config(state=tk.DISABLED)])
         return_button.place(height=35, width=90, x=445, y=600)
         CreateToolTip(return_button, "Return to the second page.")
@@ -602,9 +612,11 @@ class three_solution(tk.Frame, _variables):
 
     def __draw_sudoku_grid(self):
         '''Draw the modified sudoku in the grid'''
+        self.__stop_solving()
         self.sudoku_grid = _variables.sudoku_grid
         self.sudoku_grid_corrected = _variables.sudoku_grid_corrected
         self.canvas.delete("numbers")
+        self.canvas.delete("conflicts")
         for i in range(9):
             for j in range(9):
                 value = self.sudoku_grid_corrected[i][j]
@@ -616,13 +628,64 @@ class three_solution(tk.Frame, _variables):
 
 
     def __draw_solution(self):
-        '''Draw the resolved sudoku in the grid'''
+        '''Start solving the sudoku a few steps at a time, so that the window keeps responding during a long search'''
+        self.__stop_solving()
         self.solved_sudoku_grid = np.copy(_variables.sudoku_grid_corrected)
-        check = solve_sudoku(self.solved_sudoku_grid)
-        if check == False:
-            messagebox.showerror(title='No solution',
-                                message='This sudoku has no solution. Return to the previous page and try to correct the values.')
+        # the search counts up to 2 solutions, so the uniqueness of the solution is known without another search
+        self.steps = solve_sudoku_steps(self.solved_sudoku_grid, steps=200, limit=2)
+        self.solving = self.after(0, self.__solve_step)
+
+
+    def __solve_step(self):
+        '''Run the next steps of the search and draw the partial grid in gray, or the solution when the search ends'''
+        try:
+            partial, _ = next(self.steps)
+        except StopIteration as done:
+            self.steps = self.solving = None
+            self.__show_solution(done.value)
+            return
+
         self.canvas.delete("numbers")
+        for i in range(9):
+            for j in range(9):
+                value = partial[i][j]
+                if value != 0:
+                    x = self.margin + j * self.side + self.side / 2
+                    y = self.margin + i * self.side + self.side / 2
+                    color = "black" if value == _variables.sudoku_grid_corrected[i][j] else "gray"
+                    self.canvas.create_text(x, y, text=value, tags="numbers", fill=color, font=self.cell_font)
+        self.solving = self.after(1, self.__solve_step)
+
+
+    def __stop_solving(self):
+        '''Abandon the running search, if any'''
+        if self.solving is not None:
+            self.after_cancel(self.solving)
+        if self.steps is not None:
+            self.steps.close()
+        self.steps = self.solving = None
+
+
+    def __show_solution(self, count):
+        '''Draw the resolved sudoku in the grid, given the number of its solutions found up to 2'''
+        conflicts = []
+        if count == 0:
+            # the givens are checked again only when there is no solution
+            conflicts = find_conflicts(self.solved_sudoku_grid)
+            if conflicts:
+                cells = ', '.join(f"({i + 1}, {j + 1})" for i, j in conflicts)
+                messagebox.showerror(title='No solution',
+                                    message=f'This sudoku has no solution because of repeated digits in the cells (row, column) {cells}. '
+                                    'Return to the previous page and try to correct the values.')
+            else:
+                messagebox.showerror(title='No solution',
+                                    message='This sudoku has no solution. Return to the previous page and try to correct the values.')
+        elif count > 1:
+            messagebox.showwarning(title='More than one solution',
+                                message='This sudoku has more than one solution, only one of them is shown. '
+                                'Some digits may have been recognized wrongly, return to the previous page to check the values.')
+        self.canvas.delete("numbers")
+        self.__draw_conflicts(conflicts)
         for i in range(9):
             for j in range(9):
                 value = self.solved_sudoku_grid[i][j]
@@ -639,6 +702,17 @@ class three_solution(tk.Frame, _variables):
                     self.canvas.create_text(x, y, text=value, tags="numbers", fill=color, font=self.cell_font)
 
 
+    def __draw_conflicts(self, conflicts):
+        '''Draw a red square around the cells whose digits are repeated'''
+        self.canvas.delete("conflicts")
+        for i, j in conflicts:
+            x0 = self.margin + j * self.side + 1
+            y0 = self.margin + i * self.side + 1
+            x1 = self.margin + (j + 1) * self.side - 1
+            y1 = self.margin + (i + 1) * self.side - 1
+            self.canvas.create_rectangle(x0, y0, x1, y1, outline="red", width=2, tags="conflicts")
+
+
     def __exit(self):
         '''Exit from the program'''
         if messagebox.askyesno("Exit", "Do you really want to close the program?"):
@@ -0,0 +1,197 @@
+import numpy as np
+import os
+import json
+import random
+import platform
+import sys
+import time
+import argparse
+from math import ceil, isqrt
+from sudoku_solver import solve_sudoku, solve_with_budget, count_solutions, solve_batch, SolverStats, STATUS_SOLVED
+
+
+# the share of given cells of the benchmark puzzles and the backends timed for every board size,
+# dancing links and the plain bitmask search are not timed on 25x25 boards where they can run for minutes
+BOARD_SIZES = {
+    4: (0.40, ('bitmask', 'dlx', 'propagation')),
+    9: (0.30, ('bitmask', 'dlx', 'propagation')),
+    16: (0.45, ('bitmask', 'dlx', 'propagation')),
+    25: (0.50, ('propagation',)),
+}
+
+
+def random_puzzle(size, givens, rng):
+    '''Return a size x size puzzle with a share givens of the cells of a random solution, shuffling the bands, rows, stacks,
+    columns and digits of a pattern solution and removing random cells. The puzzle may have more than one solution'''
+    n = isqrt(size)
+    rows = [band * n + row for band in rng.sample(range(n), n) for row in rng.sample(range(n), n)]
+    cols = [stack * n + col for stack in rng.sample(range(n), n) for col in rng.sample(range(n), n)]
+    digits = rng.sample(range(1, size + 1), size)
+    sudoku = [[digits[(n * (r % n) + r // n + c) % size] for c in cols] for r in rows]
+    for cell in rng.sample(range(size * size), size * size - round(size * size * givens)):
+        sudoku[cell // size][cell % size] = 0
+
+    return sudoku
+
+
+def benchmark_board_sizes(sizes=None, puzzles=5, seed=0):
+    '''Time the solver backends on the same random puzzles of every board size and return a list of dicts
+    with the size, the backend, the number of puzzles, the mean and max seconds and the mean nodes and backtracks per puzzle'''
+    results = []
+    for size in sizes or BOARD_SIZES:
+        givens, backends = BOARD_SIZES[size]
+        rng = random.Random(seed)
+        boards = [random_puzzle(size, givens, rng) for _ in range(puzzles)]
+        for backend in backends:
+            times = []
+            stats = SolverStats()
+            for board in boards:
+                sudoku = [line[:] for line in board]
+                start = time.perf_counter()
+                if not solve_sudoku(sudoku, backend, stats=stats):
+                    raise RuntimeError(f'The {backend} backend did not solve a {size}x{size} puzzle')
+                times.append(time.perf_counter() - start)
+            results.append({'size': size, 'backend': backend, 'puzzles': puzzles,
+                            'mean': sum(times) / len(times), 'max': max(times),
+                            'nodes': stats.nodes / puzzles, 'backtracks': stats.backtracks / puzzles})
+
+    return results
+
+
+TIERS = ('easy', 'diabolical', 'seventeen', 'adversarial')
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sudoku_benchmark_puzzles')
+
+# every entry point solves a 9x9 sudoku in place, updates stats when it can and returns True if it found the unique solution
+ENTRY_POINTS = {
+    'solve_sudoku[bitmask]': lambda sudoku, stats: solve_sudoku(sudoku, 'bitmask', stats=stats),
+    'solve_sudoku[dlx]': lambda sudoku, stats: solve_sudoku(sudoku, 'dlx', stats=stats),
+    'solve_sudoku[propagation]': lambda sudoku, stats: solve_sudoku(sudoku, 'propagation', stats=stats),
+    'solve_with_budget': lambda sudoku, stats: solve_with_budget(sudoku, stats=stats)[0] == STATUS_SOLVED,
+    'count_solutions': lambda sudoku, stats: count_solutions(sudoku, stats=stats) == 1,
+    'solve_batch': lambda sudoku, stats: solve_batch(np.array([sudoku]))[1][0] == STATUS_SOLVED,
+}
+
+# the metrics compared with the baseline, the time of the puzzles that take less than NOISE_MS is not compared
+BASELINE_METRICS = ('p50_ms', 'p95_ms', 'nodes')
+NOISE_MS = 0.2
+
+
+def load_tier(tier, directory=CORPUS_DIR):
+    '''Return the puzzles of a tier of the benchmark corpus as 9x9 lists of lists, skipping the lines that start with #'''
+    with open(os.path.join(directory, tier + '.txt'), 'r') as file:
+        lines = [line.strip() for line in file if line.strip() and not line.startswith('#')]
+
+    return [[[int(value) for value in line[r * 9:r * 9 + 9].replace('.', '0')] for r in range(9)] for line in lines]
+
+
+def _percentile(values, percent):
+    '''Return the nearest-rank percentile of a list of values'''
+    values = sorted(values)
+    return values[max(ceil(len(values) * percent / 100) - 1, 0)]
+
+
+def run_suite(tiers=TIERS, entry_points=None, repeat=3):
+    '''Run every entry point on every puzzle of the tiers of the corpus, keeping the fastest of repeat runs of every puzzle,
+    and return a list of dicts with the p50, p95 and max milliseconds, the puzzles per second and the mean nodes per puzzle'''
+    results = []
+    for tier in tiers:
+        puzzles = load_tier(tier)
+        for name in entry_points or ENTRY_POINTS:
+            solve = ENTRY_POINTS[name]
+            times = []
+            stats = SolverStats()
+            for puzzle in puzzles:
+                best = float('inf')
+                for run in range(repeat):
+                    sudoku = [line[:] for line in puzzle]
+                    start = time.perf_counter()
+                    solved = solve(sudoku, stats if run == 0 else None)
+                    best = min(best, time.perf_counter() - start)
+                    if not solved:
+                        raise RuntimeError(f'{name} did not solve a puzzle of the {tier} tier')
+                times.append(best)
+
+            if name == 'solve_batch':
+                # the batch solver is meant for stacks of puzzles, so its throughput is measured on the whole tier at once
+                start = time.perf_counter()
+                solve_batch(np.array(puzzles))
+                throughput = len(puzzles) / (time.perf_counter() - start)
+            else:
+                throughput = len(puzzles) / sum(times)
+            results.append({'entry_point': name, 'tier': tier, 'puzzles': len(puzzles),
+                            'p50_ms': 1000 * _percentile(times, 50), 'p95_ms': 1000 * _percentile(times, 95),
+                            'max_ms': 1000 * max(times), 'throughput': throughput, 'nodes': stats.nodes / len(puzzles)})
+
+    return results
+
+
+def write_results(results, path):
+    '''Write the results of the suite to a JSON file with the Python version and the machine they were measured on'''
+    with open(path, 'w') as file:
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'processor': platform.processor(),
+                   'results': results}, file, indent=2)
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25):
+    '''Compare the results of the suite with the results of a baseline JSON file, or with its dict,
+    and return a message for every p50, p95 or node count that grew more than tolerance'''
+    if isinstance(baseline, str):
+        with open(baseline, 'r') as file:
+            baseline = json.load(file)
+    reference = {(row['entry_point'], row['tier']): row for row in baseline['results']}
+
+    regressions = []
+    for row in results:
+        old = reference.get((row['entry_point'], row['tier']))
+        if old is None:
+            continue
+        for metric in BASELINE_METRICS:
+            if metric.endswith('_ms') and row[metric] < NOISE_MS:
+                continue
+            if row[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{row['entry_point']} on {row['tier']}: {metric} {old[metric]:.3f} -> {row[metric]:.3f}")
+
+    return regressions
+
+
+def main(argv=None):
+    '''Command line entry point that prints the timings of the solver backends for every board size or, with --suite,
+    runs the benchmark suite on the puzzle corpus and exits with an error if it is slower than a baseline'''
+    parser = argparse.ArgumentParser(description='Time the sudoku solver backends on random puzzles of every board size.')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', choices=sorted(BOARD_SIZES), default=None, help='board sizes, all by default')
+    parser.add_argument('-n', '--puzzles', type=int, default=5, help='number of puzzles per board size')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random puzzles')
+    parser.add_argument('--suite', action='store_true', help='run the benchmark suite on the puzzle corpus instead')
+    parser.add_argument('--tiers', nargs='+', choices=TIERS, default=TIERS, help='tiers of the corpus, all by default')
+    parser.add_argument('--entry-points', nargs='+', choices=sorted(ENTRY_POINTS), default=None, help='entry points, all by default')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every puzzle, the fastest one is kept')
+    parser.add_argument('-o', '--output', default=None, help='JSON file for the results of the suite, it can be used as a baseline')
+    parser.add_argument('-b', '--baseline', default=None, help='JSON file of the results of a previous run of the suite')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.25, help='allowed growth of p50, p95 and nodes over the baseline')
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        results = run_suite(args.tiers, args.entry_points, args.repeat)
+        print(f"{'entry point':>26} {'tier':>12} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'puzzles/s':>10} {'nodes':>8}")
+        for row in results:
+            print(f"{row['entry_point']:>26} {row['tier']:>12} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['max_ms']:>9.2f} "
+                  f"{row['throughput']:>10.1f} {row['nodes']:>8.0f}")
+        if args.output:
+            write_results(results, args.output)
+        if args.baseline:
+            regressions = compare_to_baseline(results, args.baseline, args.tolerance)
+            for message in regressions:
+                print('regression: ' + message, file=sys.stderr)
+            if regressions:
+                sys.exit(1)
+        return
+
+    print(f"{'size':>7} {'backend':>12} {'mean ms':>10} {'max ms':>10} {'nodes':>10} {'backtracks':>10}")
+    for row in benchmark_board_sizes(args.sizes, args.puzzles, args.seed):
+        print(f"{row['size']:>4}x{row['size']:<2} {row['backend']:>12} {1000 * row['mean']:>10.2f} {1000 * row['max']:>10.2f} "
+              f"{row['nodes']:>10.0f} {row['backtracks']:>10.0f}")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
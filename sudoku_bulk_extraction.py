@@ -0,0 +1,136 @@
+import cv2
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from sudoku_extrapolation import ExtractionPipeline
+from sudoku_model_registry import registry, BACKENDS
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+# the status of an image: a grid was found, no grid was found (the grid is all zeros) or the image could not be processed
+STATUS_OK = 'ok'
+STATUS_NO_GRID = 'no_grid'
+STATUS_ERROR = 'error'
+
+# the pipeline of a worker process, created once with its model by _init_worker
+_pipeline = None
+
+
+def list_images(sources):
+    '''Return the image files of a list of directories, glob patterns and paths, sorted inside every source'''
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            names = sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS))
+            paths += [os.path.join(source, name) for name in names]
+        elif glob.has_magic(source):
+            paths += sorted(path for path in glob.glob(source) if os.path.isfile(path))
+        else:
+            paths.append(source)
+
+    return paths
+
+
+def _init_worker(model_name, backend):
+    '''Load and warm up the model once when a worker process starts; the pool already uses every core,
+    so OpenCV and tensorflow run on one thread per process'''
+    global _pipeline
+    cv2.setNumThreads(1)
+    if backend == 'keras':
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(1)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    registry(backend).warm_up(model_name)
+    _pipeline = ExtractionPipeline(model_name, backend=backend)
+
+
+def extract_image(path):
+    '''Extract the sudoku of an image in a worker process and return a dict with the path, the status, the grid as 81 digits,
+    where 0 is an empty cell, the seconds of the whole extraction and of every stage, and the error of an image that could not be processed'''
+    start = time.perf_counter()
+    result = {'path': path}
+    try:
+        state = _pipeline.run(path, stop_after='decode')
+        timings = dict(_pipeline.timings)
+        if state['image'] is None:
+            raise ValueError('The file is not a readable image')
+        state = _pipeline.run(state=state)
+        timings.update(_pipeline.timings)
+
+        result['status'] = STATUS_NO_GRID if state['homography'] is None else STATUS_OK
+        result['grid'] = ''.join(str(value) for value in state['sudoku_grid'].ravel())
+        result['timings'] = timings
+    except Exception as error:
+        # a broken image must not stop the other ones
+        result['status'] = STATUS_ERROR
+        result['error'] = f'{type(error).__name__}: {error}'
+    result['seconds'] = time.perf_counter() - start
+
+    return result
+
+
+def _next_results(pending, ordered):
+    '''Wait for the oldest pending extraction or, if the order does not matter, for the first ones to finish, and return their results'''
+    if ordered:
+        return [pending.popleft().result()]
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    pending.difference_update(done)
+    return [future.result() for future in done]
+
+
+def extract_images(paths, model_name, workers=None, ordered=True, backend='numpy'):
+    '''Extract the sudoku of every image on a pool of processes, each loading the model once, and yield the result of every image,
+    in the input order if ordered is True or as soon as it is ready. At most two images per worker are queued ahead,
+    so the memory does not grow with the number of images'''
+    workers = workers or os.cpu_count()
+    # the workers are started fresh, tensorflow does not work in a process forked from one that has already loaded it
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(model_name, backend)) as pool:
+        pending = deque() if ordered else set()
+        for path in paths:
+            future = pool.submit(extract_image, path)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+            while len(pending) >= 2 * workers:
+                yield from _next_results(pending, ordered)
+        while pending:
+            yield from _next_results(pending, ordered)
+
+
+def main(argv=None):
+    '''Command line entry point that writes the sudoku of every image as a JSON line'''
+    parser = argparse.ArgumentParser(description='Extract the sudoku grids of a batch of images and write one JSON line per image '
+                                     'with the path, the status, the grid as 81 digits and the timings.')
+    parser.add_argument('sources', nargs='+', help='image files, directories of images or glob patterns')
+    parser.add_argument('-m', '--model', default='sudoku_model/model_sudoku.hdf5', help='model used to recognize the digits')
+    parser.add_argument('-o', '--output', default='-', help='JSON lines file, the standard output by default')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of processes, the number of cores by default')
+    parser.add_argument('-u', '--unordered', action='store_true', help='write every result as soon as it is ready')
+    parser.add_argument('-b', '--backend', choices=BACKENDS, default='numpy', help='engine that evaluates the model, NumPy by default')
+    args = parser.parse_args(argv)
+
+    counts = {STATUS_OK: 0, STATUS_NO_GRID: 0, STATUS_ERROR: 0}
+    target = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        for result in extract_images(list_images(args.sources), args.model, args.workers, not args.unordered, args.backend):
+            target.write(json.dumps(result) + '\n')
+            target.flush()
+            counts[result['status']] += 1
+    finally:
+        if target is not sys.stdout:
+            target.close()
+
+    print(f"{counts[STATUS_OK]} grids found, {counts[STATUS_NO_GRID]} without a grid, {counts[STATUS_ERROR]} errors", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
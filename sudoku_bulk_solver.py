@@ -0,0 +1,143 @@
+import numpy as np
+import os
+import sys
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from sudoku_solver import solve_batch, STATUS_SOLVED
+from sudoku_format import FORMAT_TEXT, GridWriter, file_format, read_grids
+
+
+def parse_puzzles(lines):
+    '''Convert lines of 81 characters, where '0' or '.' is an empty cell, to a (N, 9, 9) array and a mask of the well formed lines'''
+    puzzles = np.zeros((len(lines), 81), np.int8)
+    valid = np.zeros(len(lines), bool)
+    for k, line in enumerate(lines):
+        line = line.strip().replace('.', '0')
+        # isdigit alone accepts the digits of other scripts, which are not ASCII
+        if len(line) == 81 and line.isascii() and line.isdigit():
+            puzzles[k] = np.frombuffer(line.encode('ascii'), np.uint8) - ord('0')
+            valid[k] = True
+
+    return puzzles.reshape(-1, 9, 9), valid
+
+
+def format_solutions(solved, status):
+    '''Convert a stack of solved sudoku to lines of 81 digits, an unsolvable sudoku becomes a line of 81 dots'''
+    digits = (solved.reshape(len(solved), 81) + ord('0')).astype(np.uint8)
+    return [row.tobytes().decode('ascii') if ok == STATUS_SOLVED else '.' * 81 for row, ok in zip(digits, status)]
+
+
+def solve_chunk(lines):
+    '''Solve a chunk of puzzle lines and return the lines of the solutions'''
+    puzzles, valid = parse_puzzles(lines)
+    solved, status = solve_batch(puzzles)
+    status[~valid] = 0
+
+    return format_solutions(solved, status)
+
+
+def solve_grid_chunk(grids):
+    '''Solve a (N, 9, 9) chunk of grids and return the solved grids, where an unsolvable grid is all zeros, and the number of them'''
+    solved, status = solve_batch(grids)
+    solved = solved.astype(np.uint8)
+    solved[status != STATUS_SOLVED] = 0
+
+    return solved, int((status != STATUS_SOLVED).sum())
+
+
+def _chunks(lines, chunk_size):
+    '''Split an iterable of lines into lists of at most chunk_size lines, reading only one chunk at a time'''
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def map_ordered(function, chunks, workers=None):
+    '''Apply a function to every chunk on a pool of processes and yield the results in the input order.
+    At most two chunks per worker are read ahead, so the memory does not grow with the number of chunks;
+    the function and the chunks must be picklable, it is shared by the bulk solver and the puzzle generator'''
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(function, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def solve_lines(lines, workers=None, chunk_size=2048):
+    '''Solve an iterable of puzzle lines on a pool of processes and yield the solution lines in the input order'''
+    for solutions in map_ordered(solve_chunk, _chunks(lines, chunk_size), workers):
+        yield from solutions
+
+
+def solve_grids(chunks, workers=None):
+    '''Solve an iterable of (N, 9, 9) chunks of grids on a pool of processes and yield the solved chunks and the number
+    of unsolvable grids in them in the input order'''
+    yield from map_ordered(solve_grid_chunk, chunks, workers)
+
+
+def solve_file(input_path, output_path='-', workers=None, chunk_size=2048):
+    '''Solve the puzzles of a file with 81 characters per line, or of a raw or packed grid file, and write the solutions with the same format,
+    '-' reads from the standard input or writes to the standard output. Return the number of solved and unsolvable puzzles'''
+    if input_path != '-' and file_format(input_path) != FORMAT_TEXT:
+        return _solve_grid_file(input_path, output_path, workers, chunk_size)
+
+    solved = unsolvable = 0
+    # a byte that is not text makes its line malformed instead of stopping the whole file
+    source = open(sys.stdin.fileno() if input_path == '-' else input_path, 'r', errors='replace', closefd=input_path != '-')
+    target = sys.stdout if output_path == '-' else open(output_path, 'w')
+    try:
+        for solution in solve_lines(source, workers, chunk_size):
+            target.write(solution + '\n')
+            if solution[0] == '.':
+                unsolvable += 1
+            else:
+                solved += 1
+    finally:
+        source.close()
+        if target is not sys.stdout:
+            target.close()
+
+    return solved, unsolvable
+
+
+def _solve_grid_file(input_path, output_path, workers, chunk_size):
+    '''Solve the grids of a memory-mapped raw or packed file chunk by chunk, writing an unsolvable grid as zeros'''
+    if output_path == '-':
+        raise ValueError('The solutions of a binary grid file must be written to a file')
+
+    solved = unsolvable = 0
+    with GridWriter(output_path, file_format(input_path)) as writer:
+        for grids, failed in solve_grids(read_grids(input_path, chunk_size), workers):
+            writer.write(grids)
+            solved += len(grids) - failed
+            unsolvable += failed
+
+    return solved, unsolvable
+
+
+def main(argv=None):
+    '''Command line entry point for the bulk solving of a puzzle file'''
+    parser = argparse.ArgumentParser(description='Solve a file of sudoku puzzles with 81 characters per line, '
+                                     "where '0' or '.' is an empty cell, or a raw or packed grid file written by sudoku_format.py. "
+                                     'Unsolvable puzzles are written as 81 dots, or as empty grids in a grid file.')
+    parser.add_argument('input', help="puzzle file, '-' for the standard input")
+    parser.add_argument('-o', '--output', default='-', help="solution file, the standard output by default")
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of processes, the number of cores by default')
+    parser.add_argument('-c', '--chunk-size', type=int, default=2048, help='number of puzzles sent to a process at once')
+    args = parser.parse_args(argv)
+
+    solved, unsolvable = solve_file(args.input, args.output, args.workers, args.chunk_size)
+    print(f'{solved} solved, {unsolvable} unsolvable', file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from itertools import groupby, permutations, product
+from math import factorial, isqrt
+from sudoku_solver import solve_sudoku
+
+
+def _line_keys(lines, n):
+    '''Return for every line of a grid and for every group of n lines (band) a key that does not change when the digits are relabeled,
+    when the lines are reordered or when the crossing lines are permuted inside and across their groups'''
+    size = n * n
+    cross_count = [sum(1 for line in lines if line[c]) for c in range(size)]
+    frequency = Counter(value for line in lines for value in line if value)
+
+    keys = []
+    for line in lines:
+        groups = sorted(sum(1 for c in range(s * n, s * n + n) if line[c]) for s in range(n))
+        cells = sorted((frequency[value], cross_count[c]) for c, value in enumerate(line) if value)
+        keys.append((len(cells), tuple(groups), tuple(cells)))
+
+    band_keys = []
+    for b in range(n):
+        boxes = sorted(sum(1 for r in range(b * n, b * n + n) for c in range(s * n, s * n + n) if lines[r][c]) for s in range(n))
+        band_keys.append((tuple(sorted(keys[b * n:b * n + n])), tuple(boxes)))
+
+    return keys, band_keys
+
+
+def _tie_orders(items, key):
+    '''Return every order of the items sorted by key, permuting only the items with the same key'''
+    groups = [list(group) for _, group in groupby(sorted(items, key=key), key=key)]
+    return [[item for part in choice for item in part] for choice in product(*(permutations(group) for group in groups))]
+
+
+def _tie_count(items, key):
+    '''Return the number of orders of the items sorted by key'''
+    count = 1
+    for _, group in groupby(sorted(items, key=key), key=key):
+        count *= factorial(len(list(group)))
+    return count
+
+
+def _line_orders(lines, n, limit):
+    '''Return every order of the lines of a grid that sorts the bands and the lines inside every band by their keys,
+    or None if there are more than limit orders'''
+    keys, band_keys = _line_keys(lines, n)
+    bands = [range(b * n, b * n + n) for b in range(n)]
+    count = _tie_count(range(n), band_keys.__getitem__)
+    for band in bands:
+        count *= _tie_count(band, keys.__getitem__)
+    if count > limit:
+        return None
+
+    inner = [_tie_orders(band, keys.__getitem__) for band in bands]
+    return [[line for part in choice for line in part]
+            for order in _tie_orders(range(n), band_keys.__getitem__)
+            for choice in product(*(inner[b] for b in order))]
+
+
+def canonical_form(sudoku, limit=5000):
+    '''Return a canonical form of a n^2 x n^2 sudoku puzzle under transposition, permutations of bands, stacks, rows and columns
+    and relabeling of the digits, with the transformation that maps the puzzle to it, so that equivalent puzzles have the same canonical form.
+    The canonical form is the smallest flat grid, relabeled by first appearance, among the transformations that sort the lines by invariant keys;
+    return None if the puzzle is not valid or if it is so symmetric that more than limit transformations have to be compared'''
+    size = len(sudoku)
+    n = isqrt(size)
+    if n < 1 or n * n != size or any(len(line) != size for line in sudoku):
+        raise ValueError(f"A sudoku must be a n^2 x n^2 array, not {size} rows of {sorted({len(line) for line in sudoku})} cells")
+    grid = [[int(value) for value in line] for line in sudoku]
+    if any(value < 0 or value > size for line in grid for value in line):
+        return None
+
+    best = best_transform = None
+    for transpose in (False, True):
+        lines = [list(line) for line in zip(*grid)] if transpose else grid
+        row_orders = _line_orders(lines, n, limit)
+        col_orders = _line_orders([list(line) for line in zip(*lines)], n, limit)
+        if row_orders is None or col_orders is None or len(row_orders) * len(col_orders) > limit:
+            return None
+
+        for rows in row_orders:
+            for cols in col_orders:
+                # build the candidate row by row, dropping it as soon as it is larger than the best one
+                labels = {}
+                candidate = []
+                smaller = best is None
+                for i, r in enumerate(rows):
+                    line = lines[r]
+                    row = [labels.setdefault(line[c], len(labels) + 1) if line[c] else 0 for c in cols]
+                    if not smaller:
+                        current = best[i * size:(i + 1) * size]
+                        if row > current:
+                            break
+                        smaller = row < current
+                    candidate.extend(row)
+                else:
+                    if smaller:
+                        best, best_transform = candidate, (transpose, rows, cols, labels)
+
+    return tuple(best), best_transform
+
+
+def restore(canonical, transform, size):
+    '''Map a flat grid in the canonical form back to the original puzzle, returning it as a size x size list of lists'''
+    transpose, rows, cols, labels = transform
+    digits = {label: digit for digit, label in labels.items()}
+
+    # the digits missing from the puzzle take the remaining labels in increasing order
+    missing = sorted(set(range(1, size + 1)) - set(labels))
+    digits.update(zip(range(len(labels) + 1, size + 1), missing))
+
+    grid = [[0] * size for _ in range(size)]
+    for i, r in enumerate(rows):
+        for j, c in enumerate(cols):
+            value = canonical[i * size + j]
+            grid[r][c] = digits[value] if value else 0
+    if transpose:
+        grid = [list(line) for line in zip(*grid)]
+
+    return grid
+
+
+_MISSING = object()
+
+
+class SolutionCache:
+    '''Solve sudoku puzzles through a cache of the solutions of their canonical forms, so that the same puzzle photographed twice
+    or a relabeled, permuted or transposed copy of it is solved once. The cache keeps the last max_entries solutions in memory
+    and, when path is given, up to max_disk_entries solutions in an SQLite file, removing the least recently used ones'''
+
+    def __init__(self, max_entries=10000, path=None, max_disk_entries=1000000, limit=5000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.limit = limit
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = self.uncached = 0
+
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.db.execute('CREATE TABLE IF NOT EXISTS solutions (puzzle BLOB PRIMARY KEY, solution BLOB, used INTEGER)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used)')
+            self.disk_entries, used = self.db.execute('SELECT COUNT(*), MAX(used) FROM solutions').fetchone()
+            self.clock = used or 0
+
+    def _get(self, key):
+        '''Return the stored solution of a canonical puzzle, None if it is unsolvable, _MISSING if it is not stored'''
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            if self.db is None:
+                return _MISSING
+
+            row = self.db.execute('SELECT solution FROM solutions WHERE puzzle = ?', (key,)).fetchone()
+            if row is None:
+                return _MISSING
+            self.clock += 1
+            self.db.execute('UPDATE solutions SET used = ? WHERE puzzle = ?', (self.clock, key))
+            self.disk_hits += 1
+        self._put(key, row[0], disk=False)
+        return row[0]
+
+    def _put(self, key, solution, disk=True):
+        '''Store the solution of a canonical puzzle in memory and, if disk is True, in the SQLite file'''
+        with self.lock:
+            self.entries[key] = solution
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            if self.db is None or not disk:
+                return
+
+            self.clock += 1
+            inserted = self.db.execute('INSERT OR IGNORE INTO solutions VALUES (?, ?, ?)', (key, solution, self.clock)).rowcount
+            self.disk_entries += inserted
+            if self.disk_entries > self.max_disk_entries:
+                # remove a tenth more than needed, so that the eviction does not run at every insertion
+                excess = self.disk_entries - self.max_disk_entries + self.max_disk_entries // 10
+                self.db.execute('DELETE FROM solutions WHERE puzzle IN (SELECT puzzle FROM solutions ORDER BY used LIMIT ?)', (excess,))
+                self.disk_entries = self.db.execute('SELECT COUNT(*) FROM solutions').fetchone()[0]
+
+    def solve(self, sudoku, backend='auto', propagate=True):
+        '''Solve a sudoku in place like solve_sudoku, looking up its canonical form first, and return True if it has a solution'''
+        form = canonical_form(sudoku, self.limit)
+        if form is None:
+            self.uncached += 1
+            return solve_sudoku(sudoku, backend, propagate)
+        canonical, transform = form
+        size = len(sudoku)
+        key = bytes([size]) + bytes(canonical)
+
+        solution = self._get(key)
+        if solution is _MISSING:
+            self.misses += 1
+            puzzle = [list(canonical[i:i + size]) for i in range(0, size * size, size)]
+            solution = bytes(value for line in puzzle for value in line) if solve_sudoku(puzzle, backend, propagate) else None
+            self._put(key, solution)
+        if solution is None:
+            return False
+
+        for r, line in enumerate(restore(solution, transform, size)):
+            sudoku[r][:] = line
+
+        return True
+
+    def close(self):
+        '''Close the SQLite file of the cache'''
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -1,169 +1,328 @@
 import numpy as np
 import cv2
-
-
-def extrapolate_sudoku(sudoku_image, model_name):
-    '''Given a sudoku image and a neural network model, return the sudoku array extracted from the image'''
-    # import an already trained model
-    from tensorflow.keras.models import load_model
-    model = load_model(model_name)
-
-    # open a sudoku image
-    image = cv2.imread(sudoku_image, 0)
-
-    # resize the image    
-    img_height = image.shape[0]
-    img_width = image.shape[1]
-    
-    if img_height > img_width:
-        image = cv2.resize(image, (800, 1000))
-    elif img_height < img_width:
-        image = cv2.resize(image, (1000, 800))
-    else:
-        image = cv2.resize(image, (800, 800))
-
-    # manipulate the image so that the digits are recognizable
-    blur = cv2.GaussianBlur(image, (13, 13), 0)
-
-    thresh = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 7, 2)
-
-    kernel = np.ones((3,3), np.uint8)
-    erosion = cv2.erode(thresh, kernel)
-    dilatation = cv2.dilate(erosion, kernel)
-
-    invert = cv2.bitwise_not(dilatation)
-
-    # find the largest square contour's coordinates
-    contours, hierarchy = cv2.findContours(invert, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    contours_sorted = sorted(contours, key=cv2.contourArea, reverse=True)
-
-    largest_rect_coord = []
-    for c in contours_sorted:
-        perimeter = cv2.arcLength(c, True)
-        approx = cv2.approxPolyDP(c, 0.01 * perimeter, True)
-        if len(approx) == 4:
-            largest_rect_coord = approx
-            cv2.drawContours(image, [approx], 0, (0, 255, 0), 3)
-            break
-
-    # return empty sudoku if no contours are found
-    if len(largest_rect_coord) == 0 or largest_rect_coord == []:
-        empty_sudoku = np.zeros((9, 9), np.int8)
-        return empty_sudoku
-
-    largest_rect_coord = largest_rect_coord.reshape(4,2)
-
-    # sort the coordinates
-    sum_coord = largest_rect_coord.sum(1)
-    diff_coord = np.diff(largest_rect_coord, axis=1)
-
-    pt_A = largest_rect_coord[np.argmin(sum_coord)]
-    pt_B = largest_rect_coord[np.argmax(diff_coord)]
-    pt_C = largest_rect_coord[np.argmax(sum_coord)]
-    pt_D = largest_rect_coord[np.argmin(diff_coord)]
-
-    # calculate L2 norm to find the maximum sides
-    width_AD = np.sqrt(((pt_A[0] - pt_D[0]) ** 2) + ((pt_A[1] - pt_D[1]) ** 2))
-    width_BC = np.sqrt(((pt_B[0] - pt_C[0]) ** 2) + ((pt_B[1] - pt_C[1]) ** 2))
-    maxWidth = max(int(width_AD), int(width_BC))
-
-    height_AB = np.sqrt(((pt_A[0] - pt_B[0]) ** 2) + ((pt_A[1] - pt_B[1]) ** 2))
-    height_CD = np.sqrt(((pt_C[0] - pt_D[0]) ** 2) + ((pt_C[1] - pt_D[1]) ** 2))
-    maxHeight = max(int(height_AB), int(height_CD))
-
-    input_pts = np.float32([pt_A, pt_B, pt_C, pt_D])
-    output_pts = np.float32([[0, 0],
-                            [0, maxHeight - 1],
-                            [maxWidth - 1, maxHeight - 1],
-                            [maxWidth - 1, 0]])
-
-    # warp the image and obtain a square
-    transf = cv2.getPerspectiveTransform(input_pts, output_pts)
-    warp = cv2.warpPerspective(invert, transf, (maxWidth, maxHeight), flags=cv2.INTER_LINEAR)
-    grid = cv2.resize(warp, (252, 252))
-
-    # slice the image of the grid to obtain each cell separately
-    cell = np.zeros([9, 9, 28, 28])
-
-    for i in range(9):
-        for j in range(9):
-            cell[i][j] = grid[0+28*i:28+28*i, 0+28*j:28+28*j]
-
-
-    # define the sudoku grid array where the recognized digits will be placed
-    sudoku_grid = np.zeros((9, 9), np.int8)
-
-    for i in range(9):
-        for j in range(9):
+import io
+import time
+from PIL import Image
+from sudoku_model_registry import registry
+
+
+# a digit is the contour of a component of a cell with a point closer than CENTER_RADIUS pixels to its center
+# and at least MIN_CONTOUR_POINTS points (change the values 6 and 8 if a number is not detected)
+CENTER_RADIUS = 6
+MIN_CONTOUR_POINTS = 8
+_rows, _cols = np.mgrid[0:28, 0:28]
+CELL_CENTER = (_rows - 14) ** 2 + (_cols - 14) ** 2 < CENTER_RADIUS ** 2
+
+# the size the images are normalized to, short side and long side, and the flags that decode a JPEG image
+# at 1/2, 1/4 or 1/8 of its size in the DCT domain, without turning it as its EXIF orientation says
+NORMALIZED_SIZE = (800, 1000)
+_DECODE_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE | cv2.IMREAD_IGNORE_ORIENTATION,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2 | cv2.IMREAD_IGNORE_ORIENTATION,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4 | cv2.IMREAD_IGNORE_ORIENTATION,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8 | cv2.IMREAD_IGNORE_ORIENTATION,
+}
+
+# the transpositions of an image array for every value of the EXIF orientation tag, the same ones the GUI applies to the images it shows
+EXIF_ORIENTATION = 274
+_ORIENTATIONS = {
+    2: np.fliplr,
+    3: lambda image: np.rot90(image, 2),
+    4: np.flipud,
+    5: np.transpose,
+    6: lambda image: np.rot90(image, -1),
+    7: lambda image: np.rot90(image, 2).T,
+    8: np.rot90,
+}
+
+
+def orient_image(image, orientation):
+    '''Turn an image array as the EXIF orientation tag of its file says, returning it unchanged for 1 or an unknown value'''
+    if orientation not in _ORIENTATIONS:
+        return image
+    return np.ascontiguousarray(_ORIENTATIONS[orientation](image))
+
+
+def decode_factor(size, margin=0.75, target=NORMALIZED_SIZE):
+    '''Return the largest reduction, 1, 2, 4 or 8, that keeps an image of a size at least margin times as large as the target size on both sides,
+    1 if margin is None'''
+    if margin is None:
+        return 1
+    short, long = sorted(size)
+    return max(factor for factor in (1, 2, 4, 8)
+               if factor == 1 or (short // factor >= margin * target[0] and long // factor >= margin * target[1]))
+
+
+# the stages of the extraction in order, with the intermediate result that every stage adds to the state;
+# a stage whose result is already in the state is skipped, so a run can reuse the intermediates of another one
+STAGES = ('decode', 'normalize', 'preprocess', 'locate_grid', 'warp', 'tile', 'localize_digits', 'classify')
+STAGE_RESULTS = {
+    'decode': 'image',
+    'normalize': 'resized',
+    'preprocess': 'invert',
+    'locate_grid': 'homography',
+    'warp': 'grid',
+    'tile': 'cells',
+    'localize_digits': 'digit_cells',
+    'classify': 'sudoku_grid',
+}
+
+# the corners of the 252x252 square the homography maps the corners of the grid to: top left, bottom left, bottom right and top right
+GRID_SQUARE = np.float32([[0, 0],
+                          [0, 251],
+                          [251, 251],
+                          [251, 0]])
+
+
+class ExtractionPipeline:
+    '''Extract the sudoku array from an image stage by stage, keeping the intermediate results in a state dict.
+    The seconds of every stage of the last run are kept in timings and every callback is called after a stage
+    with its name, its seconds and the state, so that the slowest stage can be measured and profiled.
+    A JPEG image is decoded at a reduced size if it stays decode_margin times as large as the normalized image, so a 12 MP photo is decoded at 1/4;
+    the thresholds of the preprocessing are tuned on images resized from the full resolution, so a reduced decode can change the digits
+    of a photo read with conflicts, and decode_margin=None decodes every image at full size as the original extraction did.
+    The digits are classified by the model evaluated with NumPy (backend='numpy') or with tensorflow (backend='keras')'''
+
+    def __init__(self, model_name=None, callbacks=None, decode_margin=0.75, backend='numpy'):
+        self.model_name = model_name
+        self.models = registry(backend)
+        self.callbacks = list(callbacks or [])
+        self.decode_margin = decode_margin
+        self.timings = {}
+
+    def add_callback(self, callback):
+        '''Call callback(stage, seconds, state) after every stage'''
+        self.callbacks.append(callback)
+
+    def run(self, sudoku_image=None, state=None, stop_after=None):
+        '''Run the stages on an image, or on the intermediates of state, and return the state.
+        The image can be a path, the encoded bytes of an image file, a binary file object or a decoded grayscale or BGR array;
+        The stages after stop_after are not run; when no grid is found, the locate_grid stage sets the homography to None
+        and the empty sudoku array is returned without running the next stages'''
+        if stop_after is not None and stop_after not in STAGES:
+            raise ValueError(f"Unknown stage '{stop_after}', choose one of {list(STAGES)}")
+        state = dict(state or {})
+        if sudoku_image is not None:
+            state['source'] = sudoku_image
+        self.timings = {}
+
+        for stage in STAGES:
+            if STAGE_RESULTS[stage] not in state:
+                start = time.perf_counter()
+                getattr(self, stage)(state)
+                seconds = time.perf_counter() - start
+                self.timings[stage] = seconds
+                for callback in self.callbacks:
+                    callback(stage, seconds, state)
+
+            # return empty sudoku if no contours are found
+            if stage == 'locate_grid' and state['homography'] is None:
+                state['sudoku_grid'] = np.zeros((9, 9), np.int8)
+                break
+            if stage == stop_after:
+                break
+
+        return state
+
+    def decode(self, state):
+        '''Open a sudoku image in grayscale, reading from the header of a JPEG image how much its decoding can be reduced,
+        and turn it as its EXIF orientation says. A decoded array is only converted to grayscale, it is already turned'''
+        source = state['source']
+        factor = orientation = 1
+        if isinstance(source, np.ndarray):
+            if source.ndim == 3:
+                source = cv2.cvtColor(source, cv2.COLOR_BGRA2GRAY if source.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+            state['decode_factor'] = factor
+            state['image'] = np.ascontiguousarray(source, np.uint8)
+            return
+
+        # the encoded image is read once from a file object and decoded from memory
+        if hasattr(source, 'read'):
+            source = source.read()
+        encoded = isinstance(source, (bytes, bytearray, memoryview))
+
+        try:
+            with Image.open(io.BytesIO(source) if encoded else source) as header:
+                orientation = header.getexif().get(EXIF_ORIENTATION, 1)
+                if header.format == 'JPEG':
+                    factor = decode_factor(header.size, self.decode_margin)
+        except (OSError, ValueError):
+            # cv2 returns None if it cannot read the image either
+            pass
+
+        if not encoded:
+            image = cv2.imread(source, _DECODE_FLAGS[factor])
+        elif len(source):
+            image = cv2.imdecode(np.frombuffer(source, np.uint8), _DECODE_FLAGS[factor])
+        else:
+            image = None
+        state['decode_factor'] = factor
+        state['image'] = None if image is None else orient_image(image, orientation)
+
+    def normalize(self, state):
+        '''Resize the image to 800x1000, 1000x800 or 800x800 pixels, following its orientation'''
+        image = state['image']
+        img_height = image.shape[0]
+        img_width = image.shape[1]
+        short, long = NORMALIZED_SIZE
+
+        if img_height > img_width:
+            state['resized'] = cv2.resize(image, (short, long))
+        elif img_height < img_width:
+            state['resized'] = cv2.resize(image, (long, short))
+        else:
+            state['resized'] = cv2.resize(image, (short, short))
+
+    def preprocess(self, state):
+        '''Manipulate the image so that the digits are recognizable'''
+        blur = cv2.GaussianBlur(state['resized'], (13, 13), 0)
+
+        thresh = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 7, 2)
+
+        kernel = np.ones((3,3), np.uint8)
+        erosion = cv2.erode(thresh, kernel)
+        dilatation = cv2.dilate(erosion, kernel)
+
+        state['invert'] = cv2.bitwise_not(dilatation)
+
+    def locate_grid(self, state):
+        '''Find the corners of the largest square contour and the homography that maps them to a 252x252 square, None if there is none'''
+        contours, hierarchy = cv2.findContours(state['invert'], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours_sorted = sorted(contours, key=cv2.contourArea, reverse=True)
+
+        state['corners'] = state['homography'] = None
+        for c in contours_sorted:
+            perimeter = cv2.arcLength(c, True)
+            approx = cv2.approxPolyDP(c, 0.01 * perimeter, True)
+            if len(approx) == 4:
+                largest_rect_coord = approx.reshape(4,2)
+                break
+        else:
+            return
+
+        # sort the coordinates
+        sum_coord = largest_rect_coord.sum(1)
+        diff_coord = np.diff(largest_rect_coord, axis=1)
+
+        pt_A = largest_rect_coord[np.argmin(sum_coord)]
+        pt_B = largest_rect_coord[np.argmax(diff_coord)]
+        pt_C = largest_rect_coord[np.argmax(sum_coord)]
+        pt_D = largest_rect_coord[np.argmin(diff_coord)]
+
+        input_pts = np.float32([pt_A, pt_B, pt_C, pt_D])
+        state['corners'] = input_pts
+        state['homography'] = cv2.getPerspectiveTransform(input_pts, GRID_SQUARE)
+
+    def warp(self, state):
+        '''Warp the image to a rectangle of the size of the grid and resize it to a 252x252 square, 28x28 pixels for every cell.
+        Warping straight to 252x252 would sample the grid without averaging its pixels and change some of the digits'''
+        # the corners of the grid are the pixels the homography maps to the corners of the square, so only the homography is needed
+        corners = np.rint(cv2.perspectiveTransform(GRID_SQUARE[np.newaxis].astype(np.float64), np.linalg.inv(state['homography'])))[0]
+        pt_A, pt_B, pt_C, pt_D = corners
+
+        # calculate L2 norm to find the maximum sides
+        max_width = max(int(np.linalg.norm(pt_A - pt_D)), int(np.linalg.norm(pt_B - pt_C)))
+        max_height = max(int(np.linalg.norm(pt_A - pt_B)), int(np.linalg.norm(pt_C - pt_D)))
+
+        output_pts = np.float32([[0, 0],
+                                [0, max_height - 1],
+                                [max_width - 1, max_height - 1],
+                                [max_width - 1, 0]])
+        transform = cv2.getPerspectiveTransform(corners.astype(np.float32), output_pts)
+        warped = cv2.warpPerspective(state['invert'], transform, (max_width, max_height), flags=cv2.INTER_LINEAR)
+        state['grid'] = cv2.resize(warped, (252, 252))
+
+    def tile(self, state):
+        '''View the image of the grid as 9x9 cells of 28x28 pixels, without copying it'''
+        state['cells'] = state['grid'].reshape(9, 28, 9, 28).swapaxes(1, 2)
+
+    def localize_digits(self, state):
+        '''Find the cells that contain a digit and put every digit in the center of a mnist-like image'''
+        cell = state['cells']
+
+        # the cells that contain a digit and their mnist-like images, predicted together at the end
+        digit_cells = []
+        mnist_images = np.zeros((81, 28, 28), np.uint8)
+
+        # a contour point is a pixel of its component, so a cell without pixels in its center has no digit
+        occupied = cell[:, :, CELL_CENTER].any(axis=2)
+
+        for i, j in np.argwhere(occupied).tolist():
             im = cell[i][j]
 
-            # make images binary for contour
-            im = cv2.convertScaleAbs(im)
-
-            # find digit contours
+            # find the connected components of the cell, the background is the label 0
             num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(im)
 
-            digit_contour = []    
-            for k in range(0, labels.max() + 1):
-                im_mask = cv2.compare(labels, k, cv2.CMP_EQ)
-                
-                cell_contours, hierarchy = cv2.findContours(im_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
+            # the digit is the last component with a contour that reaches the center of the cell,
+            # the contours with few points are lines of the grid or noise
+            digit_contour = None
+            for k in range(num_labels - 1, 0, -1):
+                x, y, w, h, area = stats[k].tolist()
+                # only a component whose bounding box reaches the center can have a contour point there,
+                # and a component one pixel wide or high is a straight line whose contour has 2 points
+                dx = max(x - 14, 14 - (x + w - 1), 0)
+                dy = max(y - 14, 14 - (y + h - 1), 0)
+                if dx * dx + dy * dy >= CENTER_RADIUS ** 2 or min(w, h) < 2:
+                    continue
+
+                # trace the component in its bounding box and one pixel around it
+                top, left = max(y - 1, 0), max(x - 1, 0)
+                window = labels[top:y + h + 1, left:x + w + 1]
+                cell_contours, hierarchy = cv2.findContours(cv2.compare(window, k, cv2.CMP_EQ), cv2.RETR_EXTERNAL,
+                                                            cv2.CHAIN_APPROX_SIMPLE, offset=(left, top))
                 for c in cell_contours:
-                    for pt in c:
-                        if np.math.sqrt((pt[0][0] - 14)**2 + (pt[0][1] - 14)**2) < 6: # change the values 6 and 8 if a number is not detected
-                            if len(c) > 0 and len(c) <8:
-                                continue
-                            else:
-                                digit_contour = c
-                                break
+                    if len(c) >= MIN_CONTOUR_POINTS and CELL_CENTER[c[:, 0, 1], c[:, 0, 0]].any():
+                        digit_contour = c
+                if digit_contour is not None:
+                    break
+
             # check if there is a digit
-            if len(digit_contour) == 0 or digit_contour == []:
-                sudoku_grid[i][j] = 0
+            if digit_contour is None:
                 continue
 
-            # bounding rectangle of the digit
+            # image just of the digit, from its bounding rectangle
             x, y, w, h = cv2.boundingRect(digit_contour)
-
-            # define a mask to make it all black, except the digit
-            mask = np.zeros_like(im)
-            mask[y:y + h, x:x + w] = 1
-
-            # clean image with the mask applied
-            clean_im = cv2.bitwise_and(im, im, mask=mask)
-            
-            # image just of the digit
-            digit_image = clean_im[y:y + h, x:x + w].copy()
+            digit_image = im[y:y + h, x:x + w]
 
             # before predicting the digit, check if there are at least 5 white pixels in the digit image, otherwise is considered noise
             pixel_threshold = 5
-            pixel_count = 0
-            for m in range(digit_image.shape[0]):
-                for n in range(digit_image.shape[1]):
-                    if digit_image[m][n] == 255:
-                        pixel_count += 1
-            if pixel_count < pixel_threshold:
-                sudoku_grid[i][j] = 0
+            if np.count_nonzero(digit_image == 255) < pixel_threshold:
                 continue
-      
-            # define a mnist-like image
-            mnist_image = np.zeros((28, 28), np.float)
 
-            # put the digit in the center of the image
+            # put the digit in the center of the next mnist-like image
+            mnist_image = mnist_images[len(digit_cells)]
             mean_row = int((28 - digit_image.shape[0]) / 2)
             mean_col = int((28 - digit_image.shape[1]) / 2)
             mnist_image[mean_row:mean_row + digit_image.shape[0], mean_col:mean_col + digit_image.shape[1]] = digit_image
 
-            # add dimension to obtain the right shape for the model (1, 28, 28, 1)
-            mnist_image = np.expand_dims(mnist_image, axis=0)
-            mnist_image = np.expand_dims(mnist_image, axis=3)
+            digit_cells.append((i, j))
+
+        state['digit_cells'] = digit_cells
+        state['mnist_images'] = mnist_images[:len(digit_cells)]
+
+    def classify(self, state):
+        '''Recognize the digits with the model and put them in the sudoku array'''
+        # take the already trained model from the registry, it is loaded only the first time
+        model = self.models.get(self.model_name)
+
+        # define the sudoku grid array where the recognized digits will be placed
+        sudoku_grid = np.zeros((9, 9), np.int8)
+
+        digit_cells = state['digit_cells']
+        if digit_cells:
+            # predict all the digits with a single call of the model on a (k, 28, 28, 1) float32 batch
+            batch = state['mnist_images'][:, :, :, np.newaxis].astype(np.float32)
+            digit_predictions = model.predict(batch, verbose=0)
 
-            # predict the digit using the model
-            digit_prediction = model.predict(mnist_image)
-            cell_value = np.argmax(digit_prediction, axis=1)
+            # assign the predictions to the sudoku cells
+            rows, cols = zip(*digit_cells)
+            sudoku_grid[rows, cols] = np.argmax(digit_predictions, axis=1)
 
-            # assign the prediction to the sudoku cell
-            sudoku_grid[i][j] = cell_value
+        state['sudoku_grid'] = sudoku_grid
 
 
-    return sudoku_grid
+def extrapolate_sudoku(sudoku_image, model_name, backend='numpy'):
+    '''Given a sudoku image and a neural network model, return the sudoku array extracted from the image.
+    The image can be a path, the encoded bytes of an image file, a binary file object or a decoded grayscale or BGR array;
+    the model is evaluated with NumPy or, with backend='keras', with tensorflow'''
+    return ExtractionPipeline(model_name, backend=backend).run(sudoku_image)['sudoku_grid']
@@ -0,0 +1,171 @@
+import numpy as np
+import os
+import sys
+import argparse
+from numpy.lib.stride_tricks import as_strided
+
+
+# a binary grid file starts with a header of HEADER_SIZE bytes: the magic bytes, the format and zeros,
+# followed by one record of RECORD_SIZE bytes for every 9x9 grid
+FORMAT_TEXT = 'text'
+FORMAT_RAW = 'raw'
+FORMAT_PACKED = 'packed'
+HEADER_SIZE = 16
+RECORD_SIZE = {FORMAT_RAW: 81, FORMAT_PACKED: 41}
+_MAGIC = b'SUDOKU'
+_FORMAT_CODES = {FORMAT_RAW: 1, FORMAT_PACKED: 2}
+
+
+def grid_to_bytes(grid):
+    '''Convert a 9x9 grid to 81 bytes of the digits from b'0' to b'9', where b'0' is an empty cell'''
+    return (np.asarray(grid, np.uint8).reshape(81) + ord('0')).tobytes()
+
+
+def grid_from_bytes(data):
+    '''Convert 81 bytes or characters of digits, where '0' or '.' is an empty cell, to a 9x9 np.uint8 array'''
+    if isinstance(data, str):
+        data = data.encode('ascii')
+    cells = np.frombuffer(data, np.uint8, 81).copy()
+    cells[cells == ord('.')] = ord('0')
+
+    return (cells - ord('0')).reshape(9, 9)
+
+
+def pack_grids(grids):
+    '''Pack a (N, 9, 9) stack of grids in a (N, 41) np.uint8 array, two cells per byte with the first cell in the high half'''
+    cells = np.zeros((len(grids), 82), np.uint8)
+    cells[:, :81] = np.asarray(grids, np.uint8).reshape(len(grids), 81)
+
+    return (cells[:, 0::2] << 4) | cells[:, 1::2]
+
+
+def unpack_grids(packed):
+    '''Unpack a (N, 41) np.uint8 array of packed grids to a (N, 9, 9) stack'''
+    cells = np.empty((len(packed), 82), np.uint8)
+    cells[:, 0::2] = packed >> 4
+    cells[:, 1::2] = packed & 15
+
+    return cells[:, :81].reshape(len(packed), 9, 9)
+
+
+def file_format(path):
+    '''Return the format of a grid file from its header, FORMAT_TEXT if it has none'''
+    with open(path, 'rb') as file:
+        header = file.read(HEADER_SIZE)
+    if len(header) == HEADER_SIZE and header.startswith(_MAGIC):
+        for name, code in _FORMAT_CODES.items():
+            if header[len(_MAGIC)] == code:
+                return name
+        raise ValueError(f'Unknown grid format {header[len(_MAGIC)]} in {path}')
+
+    return FORMAT_TEXT
+
+
+def open_grids(path):
+    '''Memory-map a grid file, returning its format and a (N, record size) np.uint8 array of its records;
+    the records of a text file are the 81 characters of its lines, without the line ending.
+    The lines of a text file must all have 81 characters and the same line ending, '\n' or '\r\n', the last one may have none:
+    the line endings are checked through the whole file, raising ValueError if the file has other lines'''
+    fmt = file_format(path)
+    size = os.path.getsize(path)
+    if fmt == FORMAT_TEXT:
+        if size == 0:
+            return fmt, np.zeros((0, 81), np.uint8)
+        data = np.memmap(path, np.uint8, 'r')
+        newlines = np.flatnonzero(data[:100] == ord('\n'))
+        record = int(newlines[0]) + 1 if len(newlines) else size + 1
+        # a file of lines of 81 characters has one '\n' per line at the end of every record, after a '\r' for the '\r\n' ending
+        count = (size + record - 1) // record
+        if (record not in (82, 83) or size % record not in (0, 81)
+                or (record == 83 and not (data[81::record] == ord('\r')).all())
+                or not (data[record - 1::record] == ord('\n')).all()
+                or np.count_nonzero(data == ord('\n')) != size // record):
+            raise ValueError(f'{path} is not a file of lines of 81 characters with the same line ending, read it line by line instead')
+        return fmt, as_strided(data, (count, 81), (record, 1), writeable=False)
+
+    record = RECORD_SIZE[fmt]
+    count = (size - HEADER_SIZE) // record
+    if count == 0:
+        return fmt, np.zeros((0, record), np.uint8)
+    return fmt, np.memmap(path, np.uint8, 'r', HEADER_SIZE, (count, record))
+
+
+def read_grids(path, chunk_size=65536):
+    '''Yield the grids of a file in (n, 9, 9) np.uint8 chunks of at most chunk_size grids, reading only one chunk at a time.
+    The chunks of a raw file are read-only views of the memory-mapped file, the others are converted chunk by chunk;
+    the cells of a text file that are not digits or '.' become values above 9, so the grid has no solution'''
+    fmt, records = open_grids(path)
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        if fmt == FORMAT_RAW:
+            yield chunk.reshape(len(chunk), 9, 9)
+        elif fmt == FORMAT_PACKED:
+            yield unpack_grids(chunk)
+        else:
+            cells = np.array(chunk)
+            cells[cells == ord('.')] = ord('0')
+            cells -= ord('0')
+            yield cells.reshape(len(chunk), 9, 9)
+
+
+class GridWriter:
+    '''Append (N, 9, 9) stacks of grids to a new file in the text, raw or packed format, as a context manager'''
+
+    def __init__(self, path, fmt=FORMAT_RAW):
+        if fmt not in (FORMAT_TEXT, FORMAT_RAW, FORMAT_PACKED):
+            raise ValueError(f"Unknown grid format '{fmt}', choose one of {[FORMAT_TEXT, FORMAT_RAW, FORMAT_PACKED]}")
+        self.fmt = fmt
+        self.count = 0
+        self.file = open(path, 'wb')
+        if fmt != FORMAT_TEXT:
+            self.file.write(_MAGIC + bytes([_FORMAT_CODES[fmt]]) + bytes(HEADER_SIZE - len(_MAGIC) - 1))
+
+    def write(self, grids):
+        '''Append a (N, 9, 9) stack of grids or a single 9x9 grid'''
+        grids = np.asarray(grids, np.uint8).reshape(-1, 81)
+        if self.fmt == FORMAT_PACKED:
+            self.file.write(pack_grids(grids).tobytes())
+        elif self.fmt == FORMAT_RAW:
+            self.file.write(np.ascontiguousarray(grids).tobytes())
+        else:
+            lines = np.empty((len(grids), 82), np.uint8)
+            lines[:, :81] = grids + ord('0')
+            lines[:, 81] = ord('\n')
+            self.file.write(lines.tobytes())
+        self.count += len(grids)
+
+    def close(self):
+        '''Close the file'''
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert(input_path, output_path, fmt=FORMAT_PACKED, chunk_size=65536):
+    '''Convert a grid file to another format chunk by chunk and return the number of grids'''
+    with GridWriter(output_path, fmt) as writer:
+        for grids in read_grids(input_path, chunk_size):
+            writer.write(grids)
+
+    return writer.count
+
+
+def main(argv=None):
+    '''Command line entry point for the conversion of grid files'''
+    parser = argparse.ArgumentParser(description='Convert a file of 9x9 grids between lines of 81 characters (text), '
+                                     '81 bytes per grid (raw) and 41 bytes per grid (packed).')
+    parser.add_argument('input', help='grid file, the format is read from its header')
+    parser.add_argument('output', help='converted grid file')
+    parser.add_argument('-f', '--format', choices=[FORMAT_TEXT, FORMAT_RAW, FORMAT_PACKED], default=FORMAT_PACKED, help='format of the output')
+    args = parser.parse_args(argv)
+
+    count = convert(args.input, args.output, args.format)
+    print(f'{count} grids written', file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
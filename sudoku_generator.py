@@ -0,0 +1,173 @@
+import sys
+import random
+import argparse
+from functools import partial
+from math import isqrt
+from sudoku_solver import solve_sudoku, solve_with_budget, count_solutions, SolverStats, STATUS_SOLVED
+from sudoku_bulk_solver import map_ordered
+
+
+# the grades from the easiest, named after the hardest technique needed by the solver:
+# singles, pointing and claiming, naked and hidden pairs, or guesses
+GRADES = ('easy', 'medium', 'hard', 'diabolical')
+
+
+def random_solution(rng, size=9):
+    '''Return a random solved size x size sudoku, filling the blocks on the diagonal, which do not share any row or column,
+    with random digits and solving the rest with a budget, so that an unlucky grid is dropped instead of searched for long'''
+    n = isqrt(size)
+    while True:
+        sudoku = [[0] * size for _ in range(size)]
+        for box in range(n):
+            digits = rng.sample(range(1, size + 1), size)
+            for k, digit in enumerate(digits):
+                sudoku[box * n + k // n][box * n + k % n] = digit
+        if solve_with_budget(sudoku, max_nodes=1000)[0] == STATUS_SOLVED:
+            return sudoku
+
+
+def dig(solution, clues, rng):
+    '''Remove the digits of a solved sudoku in a random order, as long as the puzzle keeps a unique solution,
+    until only clues digits are left or no digit can be removed. Removing more digits can only add solutions,
+    so the longest run of the next cells that can be removed together is found with a few checks instead of one per cell'''
+    size = len(solution)
+    order = rng.sample(range(size * size), size * size)
+    removed = []
+    position = 0
+
+    def unique(count):
+        puzzle = [line[:] for line in solution]
+        for cell in removed + order[position:position + count]:
+            puzzle[cell // size][cell % size] = 0
+        return count_solutions(puzzle, limit=2) == 1
+
+    while len(removed) < size * size - clues and position < len(order):
+        limit = min(size * size - clues - len(removed), len(order) - position)
+        if unique(limit):
+            removed += order[position:position + limit]
+            break
+
+        # double the run until it fails, then bisect between the last run that passed and the first that failed
+        passed, failed = 0, 1
+        while failed < limit and unique(failed):
+            passed, failed = failed, 2 * failed
+        failed = min(failed, limit)
+        while failed - passed > 1:
+            middle = (passed + failed) // 2
+            if unique(middle):
+                passed = middle
+            else:
+                failed = middle
+
+        # the cell after the run must stay
+        removed += order[position:position + passed]
+        position += passed + 1
+
+    puzzle = [line[:] for line in solution]
+    for cell in removed:
+        puzzle[cell // size][cell % size] = 0
+
+    return puzzle
+
+
+def grade_puzzle(sudoku):
+    '''Return the grade of a sudoku with a unique solution from the hardest technique the solver needs:
+    the techniques are applied from the cheapest one and a harder one is used only when the cheaper ones are stuck'''
+    techniques = {}
+    stats = SolverStats()
+    solve_sudoku([list(line) for line in sudoku], techniques=techniques, stats=stats)
+    if stats.searched:
+        return 'diabolical'
+    if techniques.get('naked_pair') or techniques.get('hidden_pair'):
+        return 'hard'
+    if techniques.get('pointing') or techniques.get('claiming'):
+        return 'medium'
+    return 'easy'
+
+
+def transform_puzzle(sudoku, rng):
+    '''Return a random equivalent of a sudoku, permuting bands, rows, stacks and columns, relabeling the digits and transposing it'''
+    size = len(sudoku)
+    n = isqrt(size)
+    rows = [band * n + row for band in rng.sample(range(n), n) for row in rng.sample(range(n), n)]
+    cols = [stack * n + col for stack in rng.sample(range(n), n) for col in rng.sample(range(n), n)]
+    digits = [0] + rng.sample(range(1, size + 1), size)
+    puzzle = [[digits[sudoku[r][c]] for c in cols] for r in rows]
+    if rng.random() < 0.5:
+        puzzle = [list(line) for line in zip(*puzzle)]
+
+    return puzzle
+
+
+def generate_puzzle(clues=30, grade=None, size=9, rng=None, max_tries=100):
+    '''Return a random size x size puzzle with a unique solution and clues given digits, or the fewest digits found above it,
+    of the given grade if it is not None. Raise RuntimeError if no puzzle of the grade is found in max_tries tries'''
+    if grade is not None and grade not in GRADES:
+        raise ValueError(f"Unknown grade '{grade}', choose one of {list(GRADES)}")
+    rng = rng or random.Random()
+
+    for _ in range(max_tries):
+        puzzle = dig(random_solution(rng, size), clues, rng)
+        if grade is None or grade_puzzle(puzzle) == grade:
+            return puzzle
+
+    raise RuntimeError(f'No {grade} puzzle with {clues} clues found in {max_tries} tries')
+
+
+def generate_chunk(count, clues, grade, size, seed, variants):
+    '''Generate count puzzles from a seed, each generated puzzle followed by variants - 1 random equivalents of it'''
+    rng = random.Random(seed)
+    puzzles = []
+    while len(puzzles) < count:
+        puzzle = generate_puzzle(clues, grade, size, rng)
+        puzzles.append(puzzle)
+        for _ in range(min(variants, count - len(puzzles) + 1) - 1):
+            puzzles.append(transform_puzzle(puzzle, rng))
+
+    return puzzles
+
+
+def _generate_chunk(spec, clues, grade, size, variants):
+    '''Generate the chunk of puzzles of a (count, seed) pair'''
+    count, seed = spec
+    return generate_chunk(count, clues, grade, size, seed, variants)
+
+
+def generate_puzzles(count, clues=30, grade=None, size=9, workers=None, seed=0, variants=1, chunk_size=64):
+    '''Generate count puzzles on a pool of processes and yield them in a repeatable order for a given seed.
+    With variants greater than 1, every generated puzzle is followed by random equivalents of it, obtained by permuting bands, rows,
+    stacks and columns, relabeling the digits and transposing: they are much cheaper to produce but are symmetric duplicates of one puzzle'''
+    specs = ((min(chunk_size, count - start), f'{seed}:{chunk}') for chunk, start in enumerate(range(0, count, chunk_size)))
+    function = partial(_generate_chunk, clues=clues, grade=grade, size=size, variants=variants)
+    for puzzles in map_ordered(function, specs, workers):
+        yield from puzzles
+
+
+def format_puzzle(sudoku):
+    '''Convert a 9x9 puzzle to a line of 81 characters, where '.' is an empty cell'''
+    return ''.join(str(value) if value else '.' for line in sudoku for value in line)
+
+
+def main(argv=None):
+    '''Command line entry point that writes generated 9x9 puzzles, one line of 81 characters per puzzle'''
+    parser = argparse.ArgumentParser(description='Generate 9x9 sudoku puzzles with a unique solution, one line of 81 characters per puzzle.')
+    parser.add_argument('-n', '--count', type=int, default=1000, help='number of puzzles')
+    parser.add_argument('-c', '--clues', type=int, default=30, help='given digits of every puzzle, puzzles that are minimal before have more')
+    parser.add_argument('-g', '--grade', choices=GRADES, default=None, help='difficulty of the puzzles, any by default')
+    parser.add_argument('-o', '--output', default='-', help="puzzle file, the standard output by default")
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of processes, the number of cores by default')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='seed of the puzzles')
+    parser.add_argument('-v', '--variants', type=int, default=1, help='puzzles written for every generated one, the others are symmetric duplicates of it')
+    args = parser.parse_args(argv)
+
+    target = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        for puzzle in generate_puzzles(args.count, args.clues, args.grade, 9, args.workers, args.seed, args.variants):
+            target.write(format_puzzle(puzzle) + '\n')
+    finally:
+        if target is not sys.stdout:
+            target.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 import numpy as np
+import os
+import sys
 import sklearn
 import tensorflow
 import cv2
@@ -69,3 +71,9 @@ def train_and_save_model():
 
     # save the model
     model.save("model_sudoku.hdf5", overwrite=True)
+
+    # write the inference-only float32, float16 and int8 files, the int8 one calibrated on training digits
+    # in the 0-255 range the extraction gives to the model (sudoku_model_export.py is in the parent directory)
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from sudoku_model_export import export_variants
+    export_variants("model_sudoku.hdf5", calibration=x_train[:1000] * 255.0)
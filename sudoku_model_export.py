@@ -0,0 +1,214 @@
+import numpy as np
+import os
+import sys
+import json
+import time
+import argparse
+import h5py
+from sudoku_numpy_model import load_numpy_model, weights_hash
+from sudoku_extrapolation import ExtractionPipeline
+from sudoku_bulk_extraction import list_images
+
+
+# the variants of an inference-only model: the weights as float32 or float16, or as int8 with a scale per output channel
+# and the inputs of every layer rounded to 8 bits with the scales calibrated on digit images
+DTYPES = ('float32', 'float16', 'int8')
+EXPORT_FORMAT = 'sudoku_inference'
+EXPORT_VERSION = 1
+
+# the images whose digits calibrate the int8 models and are compared in the report
+CALIBRATION_IMAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sudoku_test_images')
+
+
+def digit_images(paths):
+    '''Return the 28x28 mnist-like digit images of the sudoku images as a (N, 28, 28) np.uint8 array, with the number of digits of every image'''
+    pipeline = ExtractionPipeline()
+    images, counts = [], []
+    for path in paths:
+        state = pipeline.run(path, stop_after='localize_digits')
+        digits = state.get('mnist_images', np.zeros((0, 28, 28), np.uint8))
+        images.append(digits)
+        counts.append(len(digits))
+
+    return np.concatenate(images), counts
+
+
+def calibrate(model, images, batch_size=128):
+    '''Return the largest input of every Conv2D and Dense layer of a model over the calibration images, by layer name'''
+    ranges = {}
+
+    def observe(config, x):
+        ranges[config['name']] = max(ranges.get(config['name'], 0.0), float(x.max()))
+
+    for start in range(0, len(images), batch_size):
+        model.predict(images[start:start + batch_size], observer=observe)
+
+    return ranges
+
+
+def _quantize(kernel):
+    '''Quantize a kernel to int8 with a symmetric scale for every output channel, the last axis'''
+    scale = np.abs(kernel).reshape(-1, kernel.shape[-1]).max(axis=0) / 127
+    scale[scale == 0] = 1
+    return np.clip(np.rint(kernel / scale), -127, 127).astype(np.int8), scale.astype(np.float32)
+
+
+def _weight_names(group):
+    return [name.decode('utf8') if isinstance(name, bytes) else name for name in group.attrs['weight_names']]
+
+
+def export_model(model_path, output_path, dtype='float32', calibration=None):
+    '''Write an inference-only copy of a Keras model file, without the optimizer state and the training configuration, and return its metadata.
+    The weights are stored as float32, float16 or int8; an int8 model needs the calibration images its layer inputs are scaled on.
+    The file keeps the architecture of the model, so load_numpy_model reads it, and has a content hash of its weights'''
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown dtype '{dtype}', choose one of {list(DTYPES)}")
+    if dtype == 'int8' and calibration is None:
+        raise ValueError("The int8 model needs calibration images")
+    ranges = calibrate(load_numpy_model(model_path), calibration) if dtype == 'int8' else {}
+
+    with h5py.File(model_path, 'r') as source, h5py.File(output_path, 'w') as target:
+        config = json.loads(source.attrs['model_config'])
+        weights = source['model_weights'] if 'model_weights' in source else source
+        model_weights = target.create_group('model_weights')
+
+        stored = []
+        architecture = []
+        layer_names = [layer['config']['name'] for layer in config['config']['layers'] if layer['config']['name'] in weights]
+        for name in layer_names:
+            group = model_weights.create_group(name)
+            names = _weight_names(weights[name])
+            group.attrs['weight_names'] = names
+            if name in ranges:
+                # the layer inputs are non-negative, the image or the output of a ReLU, and take the 256 levels of their largest value
+                group.attrs['input_scale'] = (ranges[name] or 1.0) / 255
+
+            shapes = []
+            for weight_name in names:
+                array = np.asarray(weights[name][weight_name], np.float32)
+                scale = None
+                if dtype == 'float16':
+                    array = array.astype(np.float16)
+                elif dtype == 'int8' and array.ndim > 1:
+                    # the biases stay float32, they are few and are added to the accumulated products
+                    array, scale = _quantize(array)
+                dataset = group.create_dataset(weight_name, data=array)
+                if scale is not None:
+                    dataset.attrs['scale'] = scale
+                stored.append(array)
+                shapes.append(list(array.shape))
+            kind = next(layer['class_name'] for layer in config['config']['layers'] if layer['config']['name'] == name)
+            architecture.append({'name': name, 'class_name': kind, 'weights': shapes})
+        model_weights.attrs['layer_names'] = layer_names
+
+        metadata = {
+            'export_format': EXPORT_FORMAT,
+            'export_version': EXPORT_VERSION,
+            'dtype': dtype,
+            'source_model': os.path.basename(model_path),
+            'parameters': int(sum(array.size for array in stored)),
+            'content_hash': weights_hash(stored),
+            'calibration_images': 0 if calibration is None else len(calibration),
+        }
+        target.attrs['model_config'] = source.attrs['model_config']
+        target.attrs['architecture'] = json.dumps(architecture)
+        for key in ('backend', 'keras_version'):
+            if key in source.attrs:
+                target.attrs[key] = source.attrs[key]
+        for key, value in metadata.items():
+            target.attrs[key] = value
+
+    return metadata
+
+
+def export_variants(model_path, dtypes=DTYPES, calibration=None):
+    '''Export a model file in every dtype next to it, as model_float32.hdf5, model_float16.hdf5 and model_int8.hdf5,
+    calibrating the int8 model on the digits of CALIBRATION_IMAGES if no calibration images are given; return the paths written'''
+    if 'int8' in dtypes and calibration is None:
+        calibration, _ = digit_images(list_images([CALIBRATION_IMAGES]))
+    root = os.path.splitext(model_path)[0]
+    paths = []
+    for dtype in dtypes:
+        paths.append(f'{root}_{dtype}.hdf5')
+        export_model(model_path, paths[-1], dtype, calibration)
+
+    return paths
+
+
+def read_metadata(path):
+    '''Return the metadata of an inference-only model file, an empty dict for a Keras model file'''
+    with h5py.File(path, 'r') as file:
+        if file.attrs.get('export_format') != EXPORT_FORMAT:
+            return {}
+        return {key: value.item() if isinstance(value, np.generic) else value for key, value in file.attrs.items()
+                if key not in ('model_config', 'architecture')}
+
+
+def compare_models(reference, paths, image_paths, repeat=5):
+    '''Compare models to a reference model on the digits of sudoku images and return a row for every model, the reference first,
+    with the size of its file, the seconds to load it, the seconds to classify the digits of an image, the digits and the whole grids
+    recognized as the reference does and the largest difference of its probabilities'''
+    images, counts = digit_images(image_paths)
+    bounds = np.cumsum([0] + counts)
+    expected = None
+    rows = []
+    for path in [reference] + list(paths):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            model = load_numpy_model(path)
+        load_seconds = (time.perf_counter() - start) / repeat
+
+        model.predict(images[:1])
+        start = time.perf_counter()
+        for _ in range(repeat):
+            output = np.concatenate([model.predict(images[bounds[k]:bounds[k + 1]]) for k in range(len(counts)) if counts[k]])
+        predict_seconds = (time.perf_counter() - start) / repeat / len(counts)
+
+        if expected is None:
+            expected = output
+        digits = output.argmax(axis=1) == expected.argmax(axis=1)
+        rows.append({
+            'model': os.path.basename(path),
+            'bytes': os.path.getsize(path),
+            'load_seconds': load_seconds,
+            'image_seconds': predict_seconds,
+            'digits': f'{int(digits.sum())}/{len(digits)}',
+            'grids': f'{sum(bool(digits[bounds[k]:bounds[k + 1]].all()) for k in range(len(counts)))}/{len(counts)}',
+            'max_difference': float(np.abs(output - expected).max()),
+        })
+
+    return rows
+
+
+def format_report(rows):
+    '''Format the rows of compare_models as a text table'''
+    lines = [f"{'model':<32} {'size (KB)':>10} {'load (ms)':>10} {'image (ms)':>11} {'digits':>9} {'grids':>6} {'max diff':>9}"]
+    for row in rows:
+        lines.append(f"{row['model']:<32} {row['bytes'] / 1024:>10.0f} {row['load_seconds'] * 1000:>10.1f} {row['image_seconds'] * 1000:>11.1f} "
+                     f"{row['digits']:>9} {row['grids']:>6} {row['max_difference']:>9.2e}")
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    '''Command line entry point that exports the inference-only variants of a model and compares them to it'''
+    parser = argparse.ArgumentParser(description='Export a Keras model file without its training state as float32, float16 and int8 '
+                                     'inference-only files next to it and compare them to the original model.')
+    parser.add_argument('model', help='Keras model file saved by the training scripts')
+    parser.add_argument('-d', '--dtypes', nargs='+', choices=DTYPES, default=list(DTYPES), help='variants to export')
+    parser.add_argument('-i', '--images', nargs='+', default=[CALIBRATION_IMAGES],
+                        help='sudoku images, directories or glob patterns whose digits calibrate the int8 model and are compared')
+    parser.add_argument('-n', '--no-report', action='store_true', help='export the variants without comparing them')
+    args = parser.parse_args(argv)
+
+    image_paths = list_images(args.images)
+    calibration = digit_images(image_paths)[0] if 'int8' in args.dtypes else None
+    paths = export_variants(args.model, args.dtypes, calibration)
+    for path in paths:
+        print(f'{path} written', file=sys.stderr)
+    if not args.no_report:
+        print(format_report(compare_models(args.model, paths, image_paths)))
+
+
+if __name__ == "__main__":
+    main()
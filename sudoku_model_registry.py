@@ -0,0 +1,102 @@
+import numpy as np
+import os
+import threading
+from collections import OrderedDict
+
+
+def _load_keras_model(path):
+    '''Load a Keras model from a file, importing tensorflow only when the first model is needed'''
+    from tensorflow.keras.models import load_model
+    return load_model(path)
+
+
+def _load_numpy_model(path):
+    '''Load a Keras model file for the NumPy inference engine, which does not need tensorflow'''
+    from sudoku_numpy_model import load_numpy_model
+    return load_numpy_model(path)
+
+
+class ModelRegistry:
+    '''Keep the last max_models loaded models in memory, so that the model file is parsed once per process instead of once per image.
+    A model is found by its absolute path and is loaded again when the modification time or the size of its file change;
+    the registry can be shared by threads and a model is loaded by one thread at a time'''
+
+    def __init__(self, max_models=2, loader=_load_keras_model):
+        self.max_models = max_models
+        self.loader = loader
+        self.models = OrderedDict()
+        self.lock = threading.Lock()
+        self.loading = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def _key(self, path):
+        '''Return the absolute path of a model file and a stamp of its version, raising OSError if the file does not exist'''
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No model file '{path}'")
+        info = os.stat(path)
+        return os.path.abspath(path), (info.st_mtime_ns, info.st_size)
+
+    def _lookup(self, path, stamp):
+        '''Return the model of a path loaded from the same version of the file, None if it is not loaded'''
+        with self.lock:
+            entry = self.models.get(path)
+            if entry is None or entry[0] != stamp:
+                return None
+            self.models.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+
+    def get(self, path):
+        '''Return the model of a file, loading it if it is not in the registry or if the file changed'''
+        path, stamp = self._key(path)
+        model = self._lookup(path, stamp)
+        if model is not None:
+            return model
+
+        with self.loading:
+            # another thread may have loaded it while this one was waiting
+            model = self._lookup(path, stamp)
+            if model is not None:
+                return model
+            model = self.loader(path)
+
+        with self.lock:
+            self.misses += 1
+            self.models[path] = (stamp, model)
+            self.models.move_to_end(path)
+            while len(self.models) > self.max_models:
+                self.models.popitem(last=False)
+                self.evictions += 1
+
+        return model
+
+    def warm_up(self, path):
+        '''Load the model of a file and run a prediction on an empty input, so that the first real prediction does not build the graph'''
+        model = self.get(path)
+        model.predict(np.zeros((1,) + tuple(model.input_shape[1:]), np.float32), verbose=0)
+        return model
+
+    def unload(self, path=None):
+        '''Remove the model of a file from the registry, or every model if path is None, and return the number of models removed'''
+        with self.lock:
+            if path is None:
+                count = len(self.models)
+                self.models.clear()
+                return count
+            return 1 if self.models.pop(os.path.abspath(path), None) is not None else 0
+
+    def __len__(self):
+        return len(self.models)
+
+
+# the registries shared by the GUI, the batch jobs and the tests of a process, one for every inference backend
+BACKENDS = ('numpy', 'keras')
+models = ModelRegistry()
+numpy_models = ModelRegistry(loader=_load_numpy_model)
+
+
+def registry(backend):
+    '''Return the shared registry of the models of an inference backend, numpy or keras'''
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', choose one of {list(BACKENDS)}")
+    return numpy_models if backend == 'numpy' else models
@@ -0,0 +1,150 @@
+import numpy as np
+import json
+import h5py
+import hashlib
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def _softmax(x):
+    x = np.exp(x - x.max(axis=-1, keepdims=True))
+    return x / x.sum(axis=-1, keepdims=True)
+
+
+_ACTIVATIONS = {'linear': lambda x: x, 'relu': _relu, 'softmax': _softmax}
+
+
+def quantize_inputs(x, scale):
+    '''Round a non-negative input to the 256 levels of an 8-bit integer of a scale, as an int8 runtime sees it'''
+    return np.clip(np.rint(x / scale), 0, 255) * scale
+
+
+def dequantize(data, scale=None):
+    '''Convert stored weights to float32, multiplying int8 weights by the scale of their output channel'''
+    if scale is None:
+        return np.asarray(data, np.float32)
+    return data.astype(np.float32) * np.asarray(scale, np.float32)
+
+
+def weights_hash(arrays):
+    '''Return the SHA-256 of the stored weights of a model, in the order of its layers'''
+    digest = hashlib.sha256()
+    for array in arrays:
+        digest.update(str(array.dtype).encode('ascii'))
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def conv2d(x, kernel, bias, padding='valid'):
+    '''Convolve a (N, H, W, C) batch with a (kh, kw, C, F) kernel with stride 1, as Keras does for the 'valid' and 'same' padding,
+    multiplying a single matrix of the image patches (im2col) by the kernel'''
+    kh, kw, channels, filters = kernel.shape
+    if padding == 'same':
+        top, left = (kh - 1) // 2, (kw - 1) // 2
+        x = np.pad(x, ((0, 0), (top, kh - 1 - top), (left, kw - 1 - left), (0, 0)))
+    n, height, width = x.shape[0], x.shape[1] - kh + 1, x.shape[2] - kw + 1
+
+    if kh == kw == 1:
+        patches = x.reshape(-1, channels)
+    else:
+        # the patches are ordered as the kernel, row, column and channel
+        windows = sliding_window_view(x, (kh, kw), axis=(1, 2))
+        patches = windows.transpose(0, 1, 2, 4, 5, 3).reshape(-1, kh * kw * channels)
+
+    return (patches @ kernel.reshape(-1, filters) + bias).reshape(n, height, width, filters)
+
+
+def max_pool2d(x, pool=2):
+    '''Take the maximum of every pool x pool block of a (N, H, W, C) batch, dropping the last rows and columns as the 'valid' padding does'''
+    n, height, width, channels = x.shape
+    height, width = height // pool, width // pool
+    x = x[:, :height * pool, :width * pool]
+    return x.reshape(n, height, pool, width, pool, channels).max(axis=(2, 4))
+
+
+class NumpyModel:
+    '''A Keras Sequential model of Conv2D, MaxPooling2D, Flatten, Dropout and Dense layers evaluated with NumPy only.
+    It has the predict method and the input_shape of a Keras model, so it can take its place in the extraction.
+    The layers of an int8 model have the input_scale of their calibrated inputs in their config'''
+
+    def __init__(self, layers, input_shape):
+        self.layers = layers
+        self.input_shape = input_shape
+
+    def predict(self, x, verbose=0, observer=None):
+        '''Return the output of the model for a batch of inputs as a float32 array;
+        observer(config, x) is called with the input of every Conv2D and Dense layer, to calibrate the int8 models'''
+        x = np.asarray(x, np.float32)
+        if x.ndim == len(self.input_shape) - 1:
+            x = x[..., np.newaxis]
+        for kind, config, weights in self.layers:
+            if kind in ('Conv2D', 'Dense'):
+                if observer is not None:
+                    observer(config, x)
+                if 'input_scale' in config:
+                    x = quantize_inputs(x, config['input_scale'])
+            if kind == 'Conv2D':
+                x = _ACTIVATIONS[config.get('activation', 'linear')](conv2d(x, *weights, config['padding']))
+            elif kind == 'MaxPooling2D':
+                x = max_pool2d(x, config['pool_size'][0])
+            elif kind == 'Flatten':
+                x = x.reshape(len(x), -1)
+            elif kind == 'Dense':
+                x = _ACTIVATIONS[config.get('activation', 'linear')](x @ weights[0] + weights[1])
+
+        return x
+
+
+def _check_layer(kind, config):
+    '''Raise ValueError if the engine cannot evaluate a layer as Keras does'''
+    if kind not in ('InputLayer', 'Conv2D', 'MaxPooling2D', 'Flatten', 'Dropout', 'Dense'):
+        raise ValueError(f"The NumPy engine does not support the {kind} layer")
+    if config.get('data_format', 'channels_last') != 'channels_last':
+        raise ValueError(f"The NumPy engine supports only channels_last layers, not {kind} {config['data_format']}")
+    if config.get('activation', 'linear') not in _ACTIVATIONS:
+        raise ValueError(f"The NumPy engine does not support the {config['activation']} activation")
+    if kind == 'Conv2D' and (tuple(config['strides']) != (1, 1) or tuple(config.get('dilation_rate', (1, 1))) != (1, 1)):
+        raise ValueError("The NumPy engine supports only Conv2D layers with stride and dilation 1")
+    if kind == 'MaxPooling2D' and (len(set(config['pool_size'])) != 1 or tuple(config['strides']) != tuple(config['pool_size'])
+                                   or config['padding'] != 'valid'):
+        raise ValueError("The NumPy engine supports only square MaxPooling2D layers with the stride of the pool and no padding")
+
+
+def load_numpy_model(path):
+    '''Read the architecture and the weights of a Sequential model saved by Keras in an HDF5 file, without importing tensorflow.
+    The inference-only files of sudoku_model_export.py are read as well, raising ValueError if their weights do not match their content hash'''
+    with h5py.File(path, 'r') as file:
+        config = json.loads(file.attrs['model_config'])
+        weights = file['model_weights'] if 'model_weights' in file else file
+
+        layers = []
+        stored = []
+        input_shape = None
+        for layer in config['config']['layers']:
+            kind, layer_config = layer['class_name'], layer['config']
+            _check_layer(kind, layer_config)
+            shape = layer_config.get('batch_input_shape') or layer_config.get('batch_shape')
+            if shape is not None and input_shape is None:
+                input_shape = tuple(shape)
+            if kind in ('InputLayer', 'Dropout'):
+                continue
+
+            # the weights of a layer are stored under its name, kernel first, in the order of the weight_names attribute
+            group = weights[layer_config['name']]
+            names = [name.decode('utf8') if isinstance(name, bytes) else name for name in group.attrs['weight_names']]
+            arrays = [group[name][()] for name in names]
+            stored += arrays
+            layer_weights = [dequantize(array, group[name].attrs.get('scale')) for array, name in zip(arrays, names)]
+            if kind in ('Conv2D', 'Dense') and not layer_config.get('use_bias', True):
+                layer_weights.append(np.zeros(layer_weights[0].shape[-1], np.float32))
+            if 'input_scale' in group.attrs:
+                layer_config = dict(layer_config, input_scale=float(group.attrs['input_scale']))
+            layers.append((kind, layer_config, layer_weights))
+
+        if 'content_hash' in file.attrs and weights_hash(stored) != file.attrs['content_hash']:
+            raise ValueError(f"The weights of '{path}' do not match its content hash")
+
+    return NumpyModel(layers, input_shape)
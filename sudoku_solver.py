@@ -1,4 +1,10 @@
 import numpy as np
+import random
+import threading
+import time
+from functools import lru_cache
+from itertools import islice
+from math import isqrt
 
 
 def empty_position(sudoku):
@@ -12,7 +18,11 @@ def empty_position(sudoku):
 
 
 def check_sudoku(sudoku, number, position):
-    '''Check if rows, columns and blocks of a sudoku have all the numbers from 1 to 9'''
+    '''Check if rows, columns and blocks of a n^2 x n^2 sudoku have all the numbers from 1 to n^2'''
+    n = isqrt(len(sudoku))
+    if n * n != len(sudoku) or len(sudoku[0]) != len(sudoku):
+        raise IndexError(f"A sudoku must be a n^2 x n^2 array, not {len(sudoku)}x{len(sudoku[0])}")
+
     for j in range(len(sudoku[0])):
         if sudoku[position[0]][j] == number and position[1] != j:
             return False
@@ -21,7 +31,6 @@ def check_sudoku(sudoku, number, position):
         if sudoku[i][position[1]] == number and position[0] != i:
             return False
 
-    n = 3
     a = position[0] // n
     b = position[1] // n
 
@@ -33,29 +42,1106 @@ def check_sudoku(sudoku, number, position):
     return True
 
 
-def solve_sudoku(sudoku):
-    '''Solve a sudoku that must be a 9x9 array'''
-    # check the puzzle validity
-    for i in range(len(sudoku[0])):
-        for j in range(len(sudoku[0])):
-            if sudoku[i][j] != 0:
-                if check_sudoku(sudoku, sudoku[i][j], (i, j)) == False:
+class _MaskTable(dict):
+    '''Table of a function of the digit masks, computed once for each mask that is met'''
+
+    def __init__(self, function):
+        super().__init__()
+        self.function = function
+
+    def __missing__(self, mask):
+        value = self[mask] = self.function(mask)
+        return value
+
+
+@lru_cache(maxsize=None)
+def _tables(size):
+    '''Precompute the row, column and block of every cell, the cells of every unit and the bit counts of the digit masks of a size x size sudoku'''
+    n = isqrt(size)
+    cell_row = [cell // size for cell in range(size * size)]
+    cell_col = [cell % size for cell in range(size * size)]
+    cell_box = [(r // n) * n + c // n for r, c in zip(cell_row, cell_col)]
+
+    # cells of the rows, then of the columns, then of the blocks
+    units = [[] for _ in range(3 * size)]
+    for cell in range(size * size):
+        units[cell_row[cell]].append(cell)
+        units[size + cell_col[cell]].append(cell)
+        units[2 * size + cell_box[cell]].append(cell)
+
+    # number of candidates and list of (bit, digit) pairs of every mask of digits,
+    # precomputed for small sizes and computed only for the masks that are met for the larger ones
+    bit_count = _MaskTable(lambda mask: bin(mask).count('1'))
+    mask_digits = _MaskTable(lambda mask: [(1 << d, d + 1) for d in range(size) if mask >> d & 1])
+    if size <= 9:
+        bit_count = [bit_count[mask] for mask in range(1 << size)]
+        mask_digits = [mask_digits[mask] for mask in range(1 << size)]
+
+    return cell_row, cell_col, cell_box, units, bit_count, mask_digits
+
+
+def _read_givens(grid, size):
+    '''Fill the digit masks of rows, columns and blocks with the given digits,
+    return the masks, the empty cells and the cells whose digit is repeated or not valid'''
+    cell_row, cell_col, cell_box, units = _tables(size)[:4]
+
+    rows = [0] * size
+    cols = [0] * size
+    boxes = [0] * size
+    empty = []
+    conflicts = set()
+
+    for cell, value in enumerate(grid):
+        if value == 0:
+            empty.append(cell)
+            continue
+        if not 0 < value <= size:
+            conflicts.add(cell)
+            continue
+        bit = 1 << (value - 1)
+        r, c, b = cell_row[cell], cell_col[cell], cell_box[cell]
+
+        # a repetition is searched in the unit only when the masks already contain the digit
+        if (rows[r] | cols[c] | boxes[b]) & bit:
+            for unit, mask in ((r, rows[r]), (size + c, cols[c]), (2 * size + b, boxes[b])):
+                if mask & bit:
+                    conflicts.add(cell)
+                    conflicts.update(k for k in units[unit] if k < cell and grid[k] == value)
+        rows[r] |= bit
+        cols[c] |= bit
+        boxes[b] |= bit
+
+    return rows, cols, boxes, empty, conflicts
+
+
+def find_conflicts(sudoku):
+    '''Return the sorted (row, column) positions of the given digits that are repeated in a row, column or block'''
+    size = len(sudoku)
+    grid = [int(value) for line in sudoku for value in line]
+    conflicts = _read_givens(grid, size)[4]
+
+    return [(cell // size, cell % size) for cell in sorted(conflicts)]
+
+
+class _Contradiction(Exception):
+    '''Raised when a cell or a digit of a unit is left without candidates'''
+
+
+_TECHNIQUES = ('naked_single', 'hidden_single', 'pointing', 'claiming', 'naked_pair', 'hidden_pair')
+
+
+@lru_cache(maxsize=None)
+def _propagation_tables(size):
+    '''Precompute the peers of every cell and the intersections between blocks and lines of a size x size sudoku'''
+    cell_row, cell_col, cell_box, units = _tables(size)[:4]
+    peers = [sorted((set(units[cell_row[cell]]) | set(units[size + cell_col[cell]]) | set(units[2 * size + cell_box[cell]])) - {cell})
+             for cell in range(size * size)]
+
+    # for every block and every row or column crossing it, the shared cells, the rest of the block and the rest of the line
+    intersections = []
+    for b in range(size):
+        box = units[2 * size + b]
+        lines = sorted({cell_row[cell] for cell in box}) + sorted({size + cell_col[cell] for cell in box})
+        for line in lines:
+            segment = [cell for cell in box if cell in units[line]]
+            intersections.append((segment,
+                                  [cell for cell in box if cell not in segment],
+                                  [cell for cell in units[line] if cell not in segment]))
+
+    return peers, intersections
+
+
+class _Propagation:
+    '''Candidate masks of the empty cells of a sudoku, reduced with logical techniques before any guess'''
+
+    def __init__(self, grid, size, rows, cols, boxes):
+        self.grid = grid
+        self.size = size
+        self.cell_row, self.cell_col, self.cell_box, self.units, self.bit_count, self.mask_digits = _tables(size)
+        self.peers, self.intersections = _propagation_tables(size)
+        self.full = (1 << size) - 1
+        self.counts = dict.fromkeys(_TECHNIQUES, 0)
+
+        # the filled cells have no candidates, so an empty cell without candidates is a contradiction
+        self.cand = [0 if value else self.full & ~(rows[self.cell_row[cell]] | cols[self.cell_col[cell]] | boxes[self.cell_box[cell]])
+                     for cell, value in enumerate(grid)]
+
+    def place(self, cell, bit):
+        '''Fill a cell with a digit and remove the digit from the candidates of its peers'''
+        cand = self.cand
+        self.grid[cell] = bit.bit_length()
+        cand[cell] = 0
+        for peer in self.peers[cell]:
+            if cand[peer] & bit:
+                cand[peer] ^= bit
+                if cand[peer] == 0:
+                    raise _Contradiction
+
+    def eliminate(self, cell, bits):
+        '''Remove some digits from the candidates of an empty cell and return how many were removed'''
+        removed = self.cand[cell] & bits
+        self.cand[cell] ^= removed
+        if self.cand[cell] == 0:
+            raise _Contradiction
+        return self.bit_count[removed]
+
+    def naked_singles(self):
+        '''Fill the empty cells that have a single candidate'''
+        cand, bit_count = self.cand, self.bit_count
+        filled = 0
+        for cell in range(len(cand)):
+            if cand[cell] and bit_count[cand[cell]] == 1:
+                self.place(cell, cand[cell])
+                filled += 1
+        self.counts['naked_single'] += filled
+        return filled
+
+    def hidden_singles(self):
+        '''Fill the cells that are the only place of a digit in a row, column or block'''
+        cand, grid = self.cand, self.grid
+        filled = 0
+        for unit in self.units:
+            once = twice = placed = 0
+            for cell in unit:
+                mask = cand[cell]
+                if mask:
+                    twice |= once & mask
+                    once |= mask
+                else:
+                    placed |= 1 << (grid[cell] - 1)
+            if once | placed != self.full:
+                raise _Contradiction
+
+            for bit, _ in self.mask_digits[once & ~twice]:
+                cell = next((cell for cell in unit if cand[cell] & bit), None)
+                if cell is None:
+                    # the cell was already filled with another hidden single of the unit
+                    raise _Contradiction
+                self.place(cell, bit)
+                filled += 1
+        self.counts['hidden_single'] += filled
+        return filled
+
+    def locked_candidates(self):
+        '''Remove the digits confined to the intersection of a block and a line from the rest of the line (pointing)
+        or from the rest of the block (claiming)'''
+        cand = self.cand
+        pointing = claiming = 0
+        for segment, rest_box, rest_line in self.intersections:
+            inside = 0
+            for cell in segment:
+                inside |= cand[cell]
+            if not inside:
+                continue
+            box_mask = line_mask = 0
+            for cell in rest_box:
+                box_mask |= cand[cell]
+            for cell in rest_line:
+                line_mask |= cand[cell]
+
+            locked = inside & ~box_mask & line_mask
+            if locked:
+                for cell in rest_line:
+                    if cand[cell] & locked:
+                        pointing += self.eliminate(cell, locked)
+            locked = inside & ~line_mask & box_mask
+            if locked:
+                for cell in rest_box:
+                    if cand[cell] & locked:
+                        claiming += self.eliminate(cell, locked)
+        self.counts['pointing'] += pointing
+        self.counts['claiming'] += claiming
+        return pointing + claiming
+
+    def naked_pairs(self):
+        '''Remove the digits of two cells of a unit with the same two candidates from the rest of the unit'''
+        cand, bit_count = self.cand, self.bit_count
+        removed = 0
+        for unit in self.units:
+            pairs = {}
+            for cell in unit:
+                if bit_count[cand[cell]] == 2:
+                    pairs.setdefault(cand[cell], []).append(cell)
+            for mask, cells in pairs.items():
+                if len(cells) > 2:
+                    raise _Contradiction
+                if len(cells) == 2:
+                    for cell in unit:
+                        if cell not in cells and cand[cell] & mask:
+                            removed += self.eliminate(cell, mask)
+        self.counts['naked_pair'] += removed
+        return removed
+
+    def hidden_pairs(self):
+        '''Keep only two digits in the two cells of a unit that are the only places of both digits'''
+        cand = self.cand
+        removed = 0
+        for unit in self.units:
+            places = {}
+            for cell in unit:
+                for bit, _ in self.mask_digits[cand[cell]]:
+                    places.setdefault(bit, []).append(cell)
+            pairs = {}
+            for bit, cells in places.items():
+                if len(cells) == 2:
+                    pairs[tuple(cells)] = pairs.get(tuple(cells), 0) | bit
+            for cells, mask in pairs.items():
+                if self.bit_count[mask] > 2:
+                    raise _Contradiction
+                if self.bit_count[mask] == 2:
+                    for cell in cells:
+                        if cand[cell] & ~mask:
+                            removed += self.eliminate(cell, ~mask)
+        self.counts['hidden_pair'] += removed
+        return removed
+
+    def run(self):
+        '''Apply the techniques, restarting from the cheapest one after every change, return False on a contradiction'''
+        techniques = (self.naked_singles, self.hidden_singles, self.locked_candidates, self.naked_pairs, self.hidden_pairs)
+        try:
+            if any(value == 0 and mask == 0 for value, mask in zip(self.grid, self.cand)):
+                raise _Contradiction
+            while any(technique() for technique in techniques):
+                pass
+        except _Contradiction:
+            return False
+        return True
+
+
+class SolverStats:
+    '''Counters of the solves it is passed to, kept up to date also when a search is stopped before the end:
+    the nodes expanded, the guesses undone, the deepest stack of guesses, the search restarts,
+    the empty cells filled by propagation and by guesses in the first solution, and the wall and CPU seconds'''
+
+    def __init__(self):
+        self.backend = None
+        self.nodes = 0
+        self.backtracks = 0
+        self.max_depth = 0
+        self.restarts = 0
+        self.propagated = 0
+        self.searched = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+
+    def __repr__(self):
+        return (f'SolverStats(backend={self.backend!r}, nodes={self.nodes}, backtracks={self.backtracks}, max_depth={self.max_depth}, '
+                f'restarts={self.restarts}, propagated={self.propagated}, searched={self.searched}, '
+                f'wall_time={self.wall_time:.6f}, cpu_time={self.cpu_time:.6f})')
+
+    def as_dict(self):
+        '''Return the counters as a dict, for logs and reports'''
+        return dict(vars(self))
+
+
+def _bitmask_search(grid, size, candidates, limit, stats=None):
+    '''Fill a valid flat sudoku grid keeping the digits of every row, column and block in bitmasks
+    and filling first the empty cell with the fewest candidates, stopping after limit solutions.
+    Return the first solution, None if there is no solution, and the number of solutions found, updating stats if it is given'''
+    cell_row, cell_col, cell_box, _, bit_count, mask_digits = _tables(size)
+
+    # the search only updates the masks of the cell it fills or clears
+    rows, cols, boxes, empty, _ = _read_givens(grid, size)
+    first = None
+    found = 0
+
+    def search(depth):
+        nonlocal first, found
+        if stats is not None:
+            stats.nodes += 1
+            stats.max_depth = max(stats.max_depth, depth)
+        if depth == len(empty):
+            found += 1
+            if first is None:
+                first = list(grid)
+                if stats is not None:
+                    stats.searched += depth
+            return found >= limit
+
+        # choose the empty cell with the minimum remaining values
+        best, best_count, best_free = depth, size + 1, 0
+        for k in range(depth, len(empty)):
+            cell = empty[k]
+            free = candidates[cell] & ~(rows[cell_row[cell]] | cols[cell_col[cell]] | boxes[cell_box[cell]])
+            count = bit_count[free]
+            if count < best_count:
+                best, best_count, best_free = k, count, free
+                if count <= 1:
+                    break
+        if best_count == 0:
+            return False
+
+        empty[depth], empty[best] = empty[best], empty[depth]
+        cell = empty[depth]
+        r, c, b = cell_row[cell], cell_col[cell], cell_box[cell]
+
+        for bit, digit in mask_digits[best_free]:
+            rows[r] |= bit
+            cols[c] |= bit
+            boxes[b] |= bit
+            grid[cell] = digit
+
+            if search(depth + 1):
+                return True
+
+            rows[r] ^= bit
+            cols[c] ^= bit
+            boxes[b] ^= bit
+            if stats is not None:
+                stats.backtracks += 1
+
+        grid[cell] = 0
+        empty[depth], empty[best] = empty[best], empty[depth]
+        return False
+
+    search(0)
+    return first, found
+
+
+def _search_bitmask(grid, size, candidates, stats=None):
+    '''Return the first solution of a valid flat sudoku grid found by the bitmask search, None if there is no solution'''
+    return _bitmask_search(grid, size, candidates, 1, stats)[0]
+
+
+class _Budget(Exception):
+    '''Raised when a search run has expanded all the nodes it was allowed to'''
+
+
+def _luby(i):
+    '''Return the i-th term of the Luby sequence 1, 1, 2, 1, 1, 2, 4, ... used to size the restarts'''
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    if (1 << k) - 1 == i:
+        return 1 << (k - 1)
+    return _luby(i - (1 << (k - 1)) + 1)
+
+
+def _propagating_steps(grid, size, candidates, limit, seed=0, restart_nodes=50, check=None, stats=None, steps=0):
+    '''Fill a valid flat sudoku grid propagating naked and hidden singles after every guess and filling first the cell with the fewest candidates.
+    When a single solution is needed, ties and digits are tried in a random order and the search restarts after a number of nodes
+    that follows the Luby sequence, which avoids getting stuck on a wrong early guess of a large board.
+    The search keeps its guesses on an explicit stack, so check is called with the number of nodes expanded before every new node and can stop it
+    raising an exception, stats is updated even when the search is stopped and, if steps is not 0, the current state is yielded every steps nodes,
+    with the candidates of the empty cells and minus the digit of the filled ones.
+    Return the first solution, None if there is no solution, and the number of solutions found up to limit'''
+    cell_row, cell_col, cell_box, units, bit_count, mask_digits = _tables(size)
+    peers = _propagation_tables(size)[0]
+    cell_units = [(cell_row[cell], size + cell_col[cell], 2 * size + cell_box[cell]) for cell in range(size * size)]
+    full = (1 << size) - 1
+    rng = random.Random(seed)
+    first = None
+    found = nodes = total = flushed = 0
+
+    def flush():
+        # add to stats the nodes expanded since the last time
+        nonlocal flushed
+        if stats is not None:
+            stats.nodes += total - flushed
+            flushed = total
+
+    def place(state, cell, bit):
+        # the state keeps the candidates of the empty cells and minus the digit of the filled cells
+        queue = [(cell, bit)]
+        while queue:
+            touched = set()
+            while queue:
+                cell, bit = queue.pop()
+                mask = state[cell]
+                if mask <= 0:
+                    # a cell queued twice for the same digit is not a contradiction
+                    if mask == -bit.bit_length():
+                        continue
                     return False
+                if not mask & bit:
+                    return False
+                state[cell] = -bit.bit_length()
+                for peer in peers[cell]:
+                    mask = state[peer]
+                    if mask > 0 and mask & bit:
+                        mask ^= bit
+                        if not mask:
+                            return False
+                        state[peer] = mask
+                        touched.update(cell_units[peer])
+                        if not mask & (mask - 1):
+                            queue.append((peer, mask))
 
-    # find empty positions
-    if not empty_position(sudoku):
+            # look for hidden singles only in the units whose candidates changed
+            for unit in touched:
+                once = twice = placed = 0
+                for cell in units[unit]:
+                    mask = state[cell]
+                    if mask > 0:
+                        twice |= once & mask
+                        once |= mask
+                    elif mask:
+                        placed |= 1 << (-mask - 1)
+                    else:
+                        # an empty cell without candidates
+                        return False
+                if once | placed != full:
+                    return False
+                hidden = once & ~twice
+                if hidden:
+                    for cell in units[unit]:
+                        mask = state[cell] & hidden
+                        if state[cell] > 0 and mask:
+                            queue.append((cell, mask & -mask))
         return True
+
+    def search(state, budget, randomize):
+        nonlocal first, found, nodes, total
+        # every entry of the stack is a state with the cell guessed there and the digits still to try
+        stack = []
+        while True:
+            if check is not None:
+                check(total)
+            nodes += 1
+            total += 1
+            if nodes > budget:
+                raise _Budget
+            if stats is not None:
+                stats.max_depth = max(stats.max_depth, len(stack))
+            if steps and total % steps == 0:
+                flush()
+                yield state
+
+            # choose among the empty cells with the minimum remaining values
+            best, best_count = [], size + 1
+            for cell, mask in enumerate(state):
+                if mask > 0:
+                    count = bit_count[mask]
+                    if count < best_count:
+                        best, best_count = [cell], count
+                    elif count == best_count:
+                        best.append(cell)
+            if not best:
+                found += 1
+                if first is None:
+                    first = [-value for value in state]
+                    if stats is not None:
+                        stats.searched += len(stack)
+                if found >= limit:
+                    return True
+            else:
+                cell = rng.choice(best) if randomize else best[0]
+                options = mask_digits[state[cell]]
+                if randomize:
+                    options = rng.sample(options, len(options))
+                stack.append((state, cell, iter(options)))
+
+            # move to the next digit that survives the propagation, going back when a cell has no digits left
+            state = None
+            while stack and state is None:
+                parent, cell, options = stack[-1]
+                for bit, _ in options:
+                    child = list(parent)
+                    if place(child, cell, bit):
+                        state = child
+                        break
+                    if stats is not None:
+                        stats.backtracks += 1
+                else:
+                    stack.pop()
+                    if stats is not None and stack:
+                        stats.backtracks += 1
+            if state is None:
+                return False
+
+    # remove the digits of the given cells from the candidates of their peers
+    state = [-value if value else mask for value, mask in zip(grid, candidates)]
+    for cell, value in enumerate(grid):
+        if value:
+            bit = 1 << (value - 1)
+            for peer in peers[cell]:
+                if state[peer] > 0:
+                    state[peer] &= ~bit
+    # an empty cell left without candidates by the givens is a contradiction, the search would take it for a filled cell
+    if 0 in state:
+        return None, 0
+
+    run = 1
+    try:
+        # restarts would count the same solutions again, so the solutions are counted with a single complete search
+        if limit > 1:
+            yield from search(state, float('inf'), False)
+            return first, found
+
+        while True:
+            try:
+                nodes = 0
+                yield from search(list(state), restart_nodes * _luby(run), True)
+                return first, found
+            except _Budget:
+                run += 1
+                if stats is not None:
+                    stats.restarts += 1
+    finally:
+        flush()
+
+
+def _propagating_search(grid, size, candidates, limit, seed=0, restart_nodes=50, check=None, stats=None):
+    '''Run the propagating search to the end without yielding, return the first solution and the number of solutions found up to limit'''
+    try:
+        next(_propagating_steps(grid, size, candidates, limit, seed, restart_nodes, check, stats))
+    except StopIteration as done:
+        return done.value
+
+
+def _search_propagation(grid, size, candidates, stats=None):
+    '''Return the first solution of a valid flat sudoku grid found by the propagating search, None if there is no solution'''
+    return _propagating_search(grid, size, candidates, 1, stats=stats)[0]
+
+
+class _DancingLinks:
+    '''Exact cover matrix of a size x size sudoku stored as circular doubly linked lists of nodes'''
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        n = isqrt(size)
+        area = size * size
+        n_cols = 4 * area
+
+        # node 0 is the root, nodes from 1 to n_cols are the column headers
+        self.L = [i - 1 for i in range(n_cols + 1)]
+        self.R = [i + 1 for i in range(n_cols + 1)]
+        self.L[0], self.R[n_cols] = n_cols, 0
+        self.U = list(range(n_cols + 1))
+        self.D = list(range(n_cols + 1))
+        self.C = list(range(n_cols + 1))
+        self.S = [0] * (n_cols + 1)
+        self.ROW = [-1] * (n_cols + 1)
+        self.row_node = []
+
+        # one row for each (cell, digit) choice, covering the cell, row-digit, column-digit and block-digit constraints
+        for cell in range(area):
+            r, c = divmod(cell, size)
+            b = (r // n) * n + c // n
+            for d in range(size):
+                columns = (1 + cell, 1 + area + r * size + d, 1 + 2 * area + c * size + d, 1 + 3 * area + b * size + d)
+                first = len(self.L)
+                for k, col in enumerate(columns):
+                    node = first + k
+                    self.L.append(first + (k - 1) % 4)
+                    self.R.append(first + (k + 1) % 4)
+                    self.U.append(self.U[col])
+                    self.D.append(col)
+                    self.D[self.U[col]] = node
+                    self.U[col] = node
+                    self.C.append(col)
+                    self.ROW.append(cell * size + d)
+                    self.S[col] += 1
+                self.row_node.append(first)
+
+    def cover(self, c):
+        '''Remove a column and all the rows that intersect it'''
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        R[L[c]] = R[c]
+        L[R[c]] = L[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                D[U[j]] = D[j]
+                U[D[j]] = U[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def uncover(self, c):
+        '''Restore a column and all the rows that intersect it, in the reverse order of cover'''
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                D[U[j]] = j
+                U[D[j]] = j
+                j = L[j]
+            i = U[i]
+        R[L[c]] = c
+        L[R[c]] = c
+
+    def select(self, r):
+        '''Cover the other columns of the row of a node whose column is already covered'''
+        j = self.R[r]
+        while j != r:
+            self.cover(self.C[j])
+            j = self.R[j]
+
+    def unselect(self, r):
+        '''Uncover the other columns of the row of a node, in the reverse order of select'''
+        j = self.L[r]
+        while j != r:
+            self.uncover(self.C[j])
+            j = self.L[j]
+
+    def solutions(self, givens, stats=None):
+        '''Yield the rows of every exact cover that contains the given rows, restoring the matrix when the search ends or is closed'''
+        R, D, C, S, ROW = self.R, self.D, self.C, self.S, self.ROW
+        chosen = []
+        stack = []
+        first = True
+        try:
+            for rid in givens:
+                r = self.row_node[rid]
+                self.cover(C[r])
+                self.select(r)
+                chosen.append(r)
+
+            while True:
+                if stats is not None:
+                    stats.nodes += 1
+                    stats.max_depth = max(stats.max_depth, len(stack))
+                if R[0] == 0:
+                    if stats is not None and first:
+                        stats.searched += len(stack)
+                    first = False
+                    yield [ROW[r] for r in stack]
+                else:
+                    # choose the column with the fewest rows
+                    c, best = R[0], S[R[0]]
+                    j = R[c]
+                    while j != 0 and best > 1:
+                        if S[j] < best:
+                            c, best = j, S[j]
+                        j = R[j]
+                    if best > 0:
+                        self.cover(c)
+                        r = D[c]
+                        self.select(r)
+                        stack.append(r)
+                        continue
+
+                # backtrack to the last column that has another row to try
+                while stack:
+                    r = stack.pop()
+                    self.unselect(r)
+                    if stats is not None:
+                        stats.backtracks += 1
+                    c = C[r]
+                    r = D[r]
+                    if r != c:
+                        self.select(r)
+                        stack.append(r)
+                        break
+                    self.uncover(c)
+                else:
+                    return
+        finally:
+            while stack:
+                r = stack.pop()
+                self.unselect(r)
+                self.uncover(C[r])
+            while chosen:
+                r = chosen.pop()
+                self.unselect(r)
+                self.uncover(C[r])
+
+
+@lru_cache(maxsize=None)
+def _dancing_links(size):
+    '''Build once the exact cover matrix shared by the solves of a size x size sudoku'''
+    return _DancingLinks(size)
+
+
+def _dlx_solutions(grid, size, stats=None):
+    '''Yield the solutions of a valid flat sudoku grid as flat lists, using the shared matrix when it is free'''
+    matrix = _dancing_links(size)
+    if not matrix.lock.acquire(blocking=False):
+        # the shared matrix is in use by another search
+        matrix = _DancingLinks(size)
+        matrix.lock.acquire()
+
+    try:
+        givens = [cell * size + value - 1 for cell, value in enumerate(grid) if value]
+        for rows in matrix.solutions(givens, stats):
+            solution = list(grid)
+            for rid in rows:
+                solution[rid // size] = rid % size + 1
+            yield solution
+    finally:
+        matrix.lock.release()
+
+
+def _search_dlx(grid, size, candidates, stats=None):
+    '''Fill a valid flat sudoku grid as an exact cover problem with Algorithm X and dancing links, return None if there is no solution'''
+    solutions = _dlx_solutions(grid, size, stats)
+    try:
+        return next(solutions, None)
+    finally:
+        solutions.close()
+
+
+def _count_bitmask(grid, size, candidates, limit, stats=None):
+    '''Count the solutions of a valid flat sudoku grid with the bitmask search, stopping at limit'''
+    return _bitmask_search(grid, size, candidates, limit, stats)[1]
+
+
+def _count_dlx(grid, size, candidates, limit, stats=None):
+    '''Count the solutions of a valid flat sudoku grid enumerated with dancing links, stopping at limit'''
+    solutions = _dlx_solutions(grid, size, stats)
+    try:
+        return sum(1 for _ in islice(solutions, limit))
+    finally:
+        solutions.close()
+
+
+def _count_propagation(grid, size, candidates, limit, stats=None):
+    '''Count the solutions of a valid flat sudoku grid with the propagating search, stopping at limit'''
+    return _propagating_search(grid, size, candidates, limit, stats=stats)[1]
+
+
+_BACKENDS = {
+    'bitmask': (_search_bitmask, _count_bitmask),
+    'dlx': (_search_dlx, _count_dlx),
+    'propagation': (_search_propagation, _count_propagation),
+}
+
+
+def _choose_backend(backend, size):
+    '''Return the name of the backend, choosing the bitmask search up to 9x9 and the propagating search for larger boards'''
+    if backend == 'auto':
+        return 'bitmask' if size <= 9 else 'propagation'
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown solver backend '{backend}', choose one of {['auto'] + sorted(_BACKENDS)}")
+    return backend
+
+
+def _prepare(sudoku, propagate, techniques):
+    '''Validate the given digits once and fill the cells deduced by the logical techniques,
+    return the flat grid, its size, the empty cells of the sudoku and the candidates of every cell, or None if there is no solution'''
+    size = len(sudoku)
+    n = isqrt(size)
+    if n < 1 or n * n != size or any(len(line) != size for line in sudoku):
+        raise ValueError(f"A sudoku must be a n^2 x n^2 array, not {size} rows of {sorted({len(line) for line in sudoku})} cells")
+
+    grid = [int(value) for line in sudoku for value in line]
+    rows, cols, boxes, empty, conflicts = _read_givens(grid, size)
+    if conflicts:
+        return None
+
+    if not propagate:
+        return grid, size, empty, [(1 << size) - 1] * len(grid)
+
+    propagation = _Propagation(grid, size, rows, cols, boxes)
+    consistent = propagation.run()
+    if techniques is not None:
+        for name, count in propagation.counts.items():
+            techniques[name] = techniques.get(name, 0) + count
+    if not consistent:
+        return None
+
+    return grid, size, empty, propagation.cand
+
+
+def _start_stats(stats, backend):
+    '''Record the backend of a solve in stats and return the wall and CPU clocks at its start'''
+    stats.backend = backend
+    return time.perf_counter(), time.process_time(), stats.searched
+
+
+def _stop_stats(stats, started, empty=None):
+    '''Add the wall and CPU seconds of a solve to stats and, for a solved sudoku, the empty cells that were not guessed'''
+    wall, cpu, searched = started
+    stats.wall_time += time.perf_counter() - wall
+    stats.cpu_time += time.process_time() - cpu
+    if empty is not None:
+        stats.propagated += len(empty) - (stats.searched - searched)
+
+
+def solve_sudoku(sudoku, backend='auto', propagate=True, techniques=None, stats=None):
+    '''Solve a n^2 x n^2 sudoku (4x4, 9x9, 16x16, 25x25), with the backtracking on bitmasks (backend='bitmask'),
+    with dancing links (backend='dlx') or with a search that propagates the singles after every guess (backend='propagation');
+    'auto' uses the bitmask backend up to 9x9 and the propagation backend for larger boards.
+    Unless propagate is False, the cells that can be deduced with logical techniques are filled before any guess;
+    if techniques is a dict, it is updated with the number of cells filled by the singles
+    and the number of candidates removed by the other techniques; if stats is a SolverStats, it is updated with the work of the search'''
+    backend = _choose_backend(backend, len(sudoku))
+    if stats is not None:
+        started = _start_stats(stats, backend)
+
+    prepared = _prepare(sudoku, propagate, techniques)
+    if prepared is None:
+        if stats is not None:
+            _stop_stats(stats, started)
+        return False
+    grid, size, empty, candidates = prepared
+
+    solution = _BACKENDS[backend][0](grid, size, candidates, stats)
+    if stats is not None:
+        _stop_stats(stats, started, None if solution is None else empty)
+    if solution is None:
+        return False
+
+    # write the solution in the original array
+    for cell in empty:
+        sudoku[cell // size][cell % size] = solution[cell]
+
+    return True
+
+
+def count_solutions(sudoku, limit=2, backend='auto', stats=None):
+    '''Count the solutions of a sudoku without changing it, stopping as soon as limit solutions are found;
+    if stats is a SolverStats, it is updated with the work of the search'''
+    backend = _choose_backend(backend, len(sudoku))
+    if stats is not None:
+        started = _start_stats(stats, backend)
+
+    prepared = _prepare(sudoku, True, None)
+    if prepared is None:
+        count = 0
     else:
-        row, col = empty_position(sudoku)
+        grid, size, empty, candidates = prepared
+        count = _BACKENDS[backend][1](grid, size, candidates, limit, stats)
+    if stats is not None:
+        _stop_stats(stats, started, empty if count else None)
 
-    # check if the conditions are satisfied for each digit entered
-    for n in range(1, len(sudoku[0])+1):
-        if check_sudoku(sudoku, n, (row, col)):
-            sudoku[row][col] = n
+    return count
 
-            if solve_sudoku(sudoku):
-                return True
 
-            sudoku[row][col] = 0
+def has_unique_solution(sudoku):
+    '''Check if a sudoku has exactly one solution'''
+    return count_solutions(sudoku, limit=2) == 1
+
+
+STATUS_UNSOLVABLE = 0
+STATUS_SOLVED = 1
+STATUS_BUDGET_EXHAUSTED = 2
+STATUS_CANCELLED = 3
+
+
+class _Interrupted(Exception):
+    '''Raised inside the search to stop it with a status'''
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+def solve_with_budget(sudoku, max_nodes=None, deadline=None, cancel=None, propagate=True, stats=None):
+    '''Solve a sudoku with the iterative propagating search, stopping after max_nodes nodes, when time.monotonic() passes deadline
+    or when cancel, a threading.Event, is set. Return the status (STATUS_SOLVED, STATUS_UNSOLVABLE, STATUS_BUDGET_EXHAUSTED or STATUS_CANCELLED)
+    and a SolverStats, stats if it is given, with the work done until then; the sudoku is filled only when it is solved'''
+    if stats is None:
+        stats = SolverStats()
+    started = _start_stats(stats, 'propagation')
+    empty = None
+
+    def check(nodes):
+        if cancel is not None and cancel.is_set():
+            raise _Interrupted(STATUS_CANCELLED)
+        if max_nodes is not None and nodes >= max_nodes:
+            raise _Interrupted(STATUS_BUDGET_EXHAUSTED)
+        if deadline is not None and time.monotonic() > deadline:
+            raise _Interrupted(STATUS_BUDGET_EXHAUSTED)
+
+    try:
+        check(0)
+        prepared = _prepare(sudoku, propagate, None)
+        if prepared is None:
+            status = STATUS_UNSOLVABLE
+        else:
+            grid, size, empty, candidates = prepared
+            solution = _propagating_search(grid, size, candidates, 1, check=check, stats=stats)[0]
+            if solution is None:
+                status = STATUS_UNSOLVABLE
+            else:
+                for cell in empty:
+                    sudoku[cell // size][cell % size] = solution[cell]
+                status = STATUS_SOLVED
+    except _Interrupted as stop:
+        status = stop.status
+    _stop_stats(stats, started, empty if status == STATUS_SOLVED else None)
+
+    return status, stats
+
+
+def solve_sudoku_steps(sudoku, steps=200, propagate=True, stats=None, limit=1):
+    '''Solve a sudoku with the iterative propagating search as a generator that yields every steps nodes the partial grid,
+    a size x size list of lists where 0 is an empty cell, and a SolverStats, stats if it is given, with the work done until then.
+    The time between two steps is not counted in the stats, so the caller can draw the grid or stop the search closing the generator;
+    when the search ends the sudoku is filled if it is solved and the generator returns True if it has a solution.
+    With limit greater than 1 the search goes on after the first solution, as count_solutions does,
+    and the generator returns the number of solutions found up to limit instead'''
+    if stats is None:
+        stats = SolverStats()
+    started = _start_stats(stats, 'propagation')
+    prepared = _prepare(sudoku, propagate, None)
+    if prepared is None:
+        _stop_stats(stats, started)
+        return False if limit == 1 else 0
+    grid, size, empty, candidates = prepared
+
+    search = _propagating_steps(grid, size, candidates, limit, stats=stats, steps=steps)
+    try:
+        while True:
+            state = next(search)
+            _stop_stats(stats, started)
+            yield [[-value if value < 0 else 0 for value in state[r * size:(r + 1) * size]] for r in range(size)], stats
+            started = (time.perf_counter(), time.process_time(), started[2])
+    except StopIteration as done:
+        solution, found = done.value
+    finally:
+        search.close()
+
+    if solution is None:
+        _stop_stats(stats, started)
+        return False if limit == 1 else 0
+    for cell in empty:
+        sudoku[cell // size][cell % size] = solution[cell]
+    _stop_stats(stats, started, empty)
+
+    return True if limit == 1 else found
+
+
+@lru_cache(maxsize=None)
+def _batch_tables(size):
+    '''Precompute as arrays the cells of every unit, the units of every cell and the bit counts of the digit masks of a size x size sudoku,
+    for every mask up to 16x16 and for every byte of a mask for larger boards'''
+    cell_row, cell_col, cell_box, units = _tables(size)[:4]
+    cell_units = [[r, size + c, 2 * size + b] for r, c, b in zip(cell_row, cell_col, cell_box)]
+    bit_count = np.array([bin(mask).count('1') for mask in range(1 << size if size <= 16 else 256)], np.int8)
+
+    return np.array(units), np.array(cell_units), bit_count
+
+
+def _bit_counts(masks, bit_count):
+    '''Count the candidates of a stack of digit masks with a table of every mask or of every byte'''
+    if len(bit_count) > 256 or masks.dtype == np.int16:
+        return bit_count[masks]
+    return sum(bit_count[(masks >> shift) & 255] for shift in range(0, 32, 8))
+
+
+def _unit_masks(masks, units):
+    '''Return the digits present in at least one cell and in at least two cells of every unit of a stack of masks'''
+    cells = masks[:, units]
+    once = np.zeros(cells.shape[:2], masks.dtype)
+    twice = np.zeros_like(once)
+    for k in range(cells.shape[2]):
+        twice |= once & cells[:, :, k]
+        once |= cells[:, :, k]
+
+    return once, twice
+
+
+def _propagate_batch(masks, size):
+    '''Apply naked and hidden singles to a (k, size * size) stack of candidate masks until nothing changes,
+    return which puzzles are left without candidates for a cell or a digit of a unit'''
+    units, cell_units, bit_count = _batch_tables(size)
+    full = (1 << size) - 1
+    active = np.arange(len(masks))
+    broken = np.zeros(len(masks), bool)
+
+    while active.size:
+        current = masks[active]
+        before = current.copy()
+
+        # remove the digits of the solved cells from the other cells of their row, column and block
+        single = _bit_counts(current, bit_count) == 1
+        once, twice = _unit_masks(np.where(single, current, 0), units)
+        failed = (twice != 0).any(axis=1)
+        solved_digits = np.bitwise_or.reduce(once[:, cell_units], axis=2)
+        current = np.where(single, current, current & ~solved_digits)
+
+        # fill the cells that are the only place of a digit in a row, column or block
+        once, twice = _unit_masks(current, units)
+        failed |= (once != full).any(axis=1)
+        hidden = np.bitwise_or.reduce((once & ~twice)[:, cell_units], axis=2) & current
+        current = np.where(hidden != 0, hidden, current)
+
+        # a cell without candidates or the only place of two digits means that there is no solution
+        failed |= ((current == 0) | (_bit_counts(current, bit_count) > 1) & (hidden != 0)).any(axis=1)
+        changed = (current != before).any(axis=1)
+
+        masks[active] = current
+        broken[active[failed]] = True
+        active = active[changed & ~failed]
+
+    return broken
+
+
+def _search_batch(masks, size):
+    '''Search a (k, size * size) stack of propagated candidate masks together, expanding one node of the depth-first search of every puzzle
+    at each step with array operations: the cell with the fewest candidates takes its lowest digit and the other digits are kept on the stack
+    of the puzzle to backtrack to. Return the masks of the solutions and which puzzles have one'''
+    bit_count = _batch_tables(size)[2]
+    current = masks.copy()
+    found = np.zeros(len(masks), bool)
+    stack = np.zeros((len(masks), 16, masks.shape[1]), masks.dtype)
+    depth = np.zeros(len(masks), np.intp)
+    active = np.arange(len(masks))
+
+    while active.size:
+        nodes = current[active]
+        broken = _propagate_batch(nodes, size)
+        counts = _bit_counts(nodes, bit_count)
+        solved = ~broken & (counts == 1).all(axis=1)
+        current[active] = nodes
+        found[active[solved]] = True
+
+        # a contradiction goes back to the last guess of the puzzle, the puzzles without guesses left have no solution
+        back = active[broken & (depth[active] > 0)]
+        depth[back] -= 1
+        current[back] = stack[back, depth[back]]
+
+        # guess the lowest candidate of the cell with the fewest candidates, keeping the others for the backtracking
+        guess = ~broken & ~solved
+        puzzles = active[guess]
+        cells = np.where(counts[guess] > 1, counts[guess], size + 1).argmin(axis=1)
+        options = nodes[guess, cells]
+        lowest = options & -options
+        if puzzles.size and depth[puzzles].max() == stack.shape[1]:
+            stack = np.concatenate([stack, np.zeros_like(stack)], axis=1)
+        stack[puzzles, depth[puzzles]] = nodes[guess]
+        stack[puzzles, depth[puzzles], cells] = options & ~lowest
+        depth[puzzles] += 1
+        current[puzzles, cells] = lowest
+
+        active = np.concatenate([back, puzzles])
+
+    return current, found
+
+
+def solve_batch(grids, chunk_size=256):
+    '''Solve a (N, 9, 9) stack of sudoku puzzles, or of any other n^2 x n^2 size, propagating the singles on the whole stack with array operations
+    and searching only the puzzles that are still unresolved.
+    Return the stack of solutions, where the unsolvable puzzles are left as given, and an array with the status of each puzzle'''
+    grids = np.asarray(grids)
+    size = grids.shape[1]
+    bit_count = _batch_tables(size)[2]
+
+    # the candidates of every cell are packed in the bits of a mask:
+    # a given digit has a single candidate, an empty cell has all of them, an invalid digit has none
+    values = grids.reshape(len(grids), size * size).astype(np.int32)
+    valid = (values > 0) & (values <= size)
+    masks = np.where(values == 0, (1 << size) - 1, np.where(valid, 1 << np.where(valid, values - 1, 0), 0))
+    masks = masks.astype(np.int16 if size < 16 else np.int32)
+
+    # propagate on chunks of puzzles whose masks fit in the cache
+    broken = np.zeros(len(grids), bool)
+    for start in range(0, len(grids), chunk_size):
+        broken[start:start + chunk_size] = _propagate_batch(masks[start:start + chunk_size], size)
+
+    singles = _bit_counts(masks, bit_count) == 1
+    digits = np.where(singles, np.log2(np.maximum(masks, 1)).astype(np.int16) + 1, 0)
+    resolved = ~broken & singles.all(axis=1)
+
+    solved = grids.copy()
+    status = np.full(len(grids), STATUS_UNSOLVABLE, np.int8)
+    solved[resolved] = digits[resolved].reshape(-1, size, size)
+    status[resolved] = STATUS_SOLVED
+
+    # search the remaining puzzles together starting from their reduced candidates
+    remaining = np.flatnonzero(~broken & ~resolved)
+    for start in range(0, len(remaining), chunk_size):
+        chunk = remaining[start:start + chunk_size]
+        solutions, found = _search_batch(masks[chunk], size)
+        digits = np.log2(solutions[found]).astype(np.int16) + 1
+        solved[chunk[found]] = digits.reshape(-1, size, size)
+        status[chunk[found]] = STATUS_SOLVED
 
-    return False
+    return solved, status
@@ -1,7 +1,21 @@
 import numpy as np
+import os
 import random
-from sudoku_solver import empty_position, check_sudoku, solve_sudoku
-from sudoku_extrapolation import extrapolate_sudoku
+import threading
+import time
+from sudoku_solver import empty_position, check_sudoku, solve_sudoku, find_conflicts
+from sudoku_solver import solve_batch, STATUS_SOLVED, STATUS_UNSOLVABLE, count_solutions, has_unique_solution
+from sudoku_solver import solve_with_budget, STATUS_BUDGET_EXHAUSTED, STATUS_CANCELLED, SolverStats, solve_sudoku_steps
+from sudoku_bulk_solver import solve_lines, solve_file
+from sudoku_format import GridWriter, read_grids, pack_grids, unpack_grids, grid_from_bytes, grid_to_bytes
+from sudoku_benchmark import random_puzzle, load_tier, run_suite, compare_to_baseline, TIERS
+from sudoku_cache import canonical_form, SolutionCache
+from sudoku_generator import generate_puzzle, generate_puzzles, grade_puzzle, transform_puzzle
+from sudoku_model_registry import ModelRegistry, registry
+from sudoku_numpy_model import load_numpy_model, conv2d, max_pool2d
+from sudoku_model_export import export_model, digit_images, compare_models, read_metadata
+from sudoku_bulk_extraction import extract_images, list_images
+from sudoku_extrapolation import extrapolate_sudoku, ExtractionPipeline, STAGES, orient_image, decode_factor
 import pytest
 import hypothesis
 from hypothesis import given
@@ -190,6 +204,40 @@ def test_check_2x3():
         check_sudoku(my_array, 5, (1, 1))
 
 
+def test_check_sudoku_4x4():
+    '''Test the function on a 4x4 sudoku with 2x2 blocks'''
+    sudoku = [
+        [1, 0, 0, 0],
+        [0, 0, 3, 0],
+        [0, 4, 0, 0],
+        [0, 0, 0, 2]
+    ]
+    assert check_sudoku(sudoku, 2, (0, 1)) == True, "Should be True"
+    assert check_sudoku(sudoku, 3, (1, 0)) == False, "Should be False"
+
+
+def test_solve_sudoku_sizes():
+    '''Test if random 4x4, 16x16 and 25x25 puzzles are solved by every backend without changing the given cells'''
+    rng = random.Random(1)
+    for size, backends in [(4, ('bitmask', 'dlx', 'propagation')), (16, ('bitmask', 'dlx', 'propagation')), (25, ('auto',))]:
+        puzzle = random_puzzle(size, 0.6, rng)
+        for backend in backends:
+            sudoku = [line[:] for line in puzzle]
+            assert solve_sudoku(sudoku, backend) == True, "Should be True"
+            digits = set(range(1, size + 1))
+            assert all(set(line) == digits for line in sudoku), "Should be True"
+            assert all(set(line) == digits for line in zip(*sudoku)), "Should be True"
+            assert all(value in (0, sudoku[r][c]) for r, line in enumerate(puzzle) for c, value in enumerate(line)), "Should be True"
+
+
+def test_count_solutions_16x16():
+    '''Test if the propagation backend counts the solutions of a 16x16 sudoku'''
+    sudoku = random_puzzle(16, 1, random.Random(2))
+    sudoku[0][0] = sudoku[0][1] = sudoku[1][0] = sudoku[1][1] = 0
+    assert count_solutions(sudoku) == 1, "Should be 1"
+    assert count_solutions(sudoku, backend='dlx') == 1, "Should be 1"
+
+
 def test_solve_sudoku_1():
     '''Test if a valid sudoku puzzle is solved'''
     sudoku = [
@@ -248,18 +296,675 @@ def test_solve_sudoku_empty():
         [1, 2, 3, 4, 5, 6, 7, 8, 9],
         [4, 5, 6, 7, 8, 9, 1, 2, 3],
         [7, 8, 9, 1, 2, 3, 4, 5, 6],
-        [2, 1, 4, 3, 6, 5, 8, 9, 7],
-        [3, 6, 5, 8, 9, 7, 2, 1, 4],
-        [8, 9, 7, 2, 1, 4, 3, 6, 5],
-        [5, 3, 1, 6, 4, 2, 9, 7, 8],
-        [6, 4, 2, 9, 7, 8, 5, 3, 1],
-        [9, 7, 8, 5, 3, 1, 6, 4, 2]
+        [2, 6, 1, 9, 3, 4, 8, 7, 5],
+        [8, 3, 4, 5, 1, 7, 6, 9, 2],
+        [5, 9, 7, 2, 6, 8, 3, 1, 4],
+        [3, 1, 2, 6, 7, 5, 9, 4, 8],
+        [6, 4, 5, 8, 9, 1, 2, 3, 7],
+        [9, 7, 8, 3, 4, 2, 5, 6, 1]
     ]
     assert solve_sudoku(empty_sudoku) == True, "Should be True"
     solve_sudoku(empty_sudoku)
     assert (empty_sudoku == sudoku).all() == True, "Should be filled in a different way"
 
 
+def test_solve_sudoku_hard():
+    '''Test if a hard sudoku puzzle is solved without changing the given digits'''
+    sudoku = [
+        [8, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 3, 6, 0, 0, 0, 0, 0],
+        [0, 7, 0, 0, 9, 0, 2, 0, 0],
+        [0, 5, 0, 0, 0, 7, 0, 0, 0],
+        [0, 0, 0, 0, 4, 5, 7, 0, 0],
+        [0, 0, 0, 1, 0, 0, 0, 3, 0],
+        [0, 0, 1, 0, 0, 0, 0, 6, 8],
+        [0, 0, 8, 5, 0, 0, 0, 1, 0],
+        [0, 9, 0, 0, 0, 0, 4, 0, 0]
+    ]
+    given = np.copy(sudoku)
+    assert solve_sudoku(sudoku) == True, "Should be True"
+    for i in range(len(sudoku)):
+        for j in range(len(sudoku)):
+            assert check_sudoku(sudoku, sudoku[i][j], (i, j)) == True, "Should be True"
+            assert given[i][j] == 0 or given[i][j] == sudoku[i][j], "Should keep the given digits"
+
+
+def test_find_conflicts_repetition():
+    '''Test if the cells of a digit repeated in a row are found'''
+    sudoku = [
+        [4, 0, 0, 6, 7, 0, 0, 8, 0],
+        [0, 1, 0, 3, 0, 0, 0, 2, 4],
+        [0, 0, 9, 0, 0, 1, 6, 0, 0],
+        [7, 9, 4, 5, 0, 0, 4, 0, 0],
+        [5, 0, 0, 0, 3, 0, 0, 0, 8],
+        [0, 0, 8, 0, 0, 2, 0, 7, 9],
+        [0, 0, 6, 7, 0, 0, 8, 0, 0],
+        [2, 7, 0, 0, 0, 4, 0, 9, 0],
+        [0, 8, 0, 0, 2, 3, 0, 0, 6]
+    ]
+    assert find_conflicts(sudoku) == [(3, 2), (3, 6)], "Should be [(3, 2), (3, 6)]"
+
+
+def test_find_conflicts_none():
+    '''Test if no conflict is found in an impossible sudoku without repetitions'''
+    sudoku = [
+        [4, 0, 0, 6, 7, 0, 0, 8, 0],
+        [8, 1, 0, 3, 0, 0, 0, 2, 4],
+        [0, 0, 9, 0, 0, 1, 6, 0, 0],
+        [7, 9, 0, 5, 0, 0, 4, 0, 0],
+        [5, 0, 0, 0, 3, 0, 0, 0, 8],
+        [0, 0, 8, 0, 0, 2, 0, 7, 9],
+        [0, 0, 6, 7, 0, 0, 8, 0, 0],
+        [2, 7, 0, 0, 0, 4, 0, 9, 0],
+        [0, 8, 0, 0, 2, 3, 0, 0, 6]
+    ]
+    assert find_conflicts(sudoku) == [], "Should be an empty list"
+
+
+def test_solve_sudoku_dlx():
+    '''Test if a valid sudoku puzzle is solved by the dancing links backend, twice with the same matrix'''
+    sudoku = [
+        [7, 5, 0, 0, 0, 0, 2, 0, 0],
+        [2, 6, 9, 0, 0, 7, 0, 0, 0],
+        [0, 3, 0, 0, 8, 9, 0, 0, 7],
+        [0, 0, 0, 6, 0, 2, 3, 8, 0],
+        [0, 0, 6, 0, 3, 0, 4, 0, 0],
+        [0, 9, 2, 8, 0, 4, 0, 0, 0],
+        [5, 0, 0, 9, 2, 0, 0, 6, 0],
+        [0, 0, 0, 3, 0, 0, 9, 2, 5],
+        [0, 0, 3, 0, 0, 0, 0, 1, 4]
+    ]
+    expected = np.copy(sudoku)
+    assert solve_sudoku(expected) == True, "Should be True"
+    for _ in range(2):
+        solved = np.copy(sudoku)
+        assert solve_sudoku(solved, backend='dlx') == True, "Should be True"
+        assert (solved == expected).all(), "Should be the same solution of the bitmask backend"
+
+
+def test_solve_sudoku_dlx_impossible():
+    '''Test if an impossible sudoku puzzle is not solved by the dancing links backend'''
+    sudoku = [
+        [4, 0, 0, 6, 7, 0, 0, 8, 0],
+        [8, 1, 0, 3, 0, 0, 0, 2, 4],
+        [0, 0, 9, 0, 0, 1, 6, 0, 0],
+        [7, 9, 0, 5, 0, 0, 4, 0, 0],
+        [5, 0, 0, 0, 3, 0, 0, 0, 8],
+        [0, 0, 8, 0, 0, 2, 0, 7, 9],
+        [0, 0, 6, 7, 0, 0, 8, 0, 0],
+        [2, 7, 0, 0, 0, 4, 0, 9, 0],
+        [0, 8, 0, 0, 2, 3, 0, 0, 6]
+    ]
+    assert solve_sudoku(sudoku, backend='dlx') == False, "Should be False"
+
+
+def test_solve_sudoku_unknown_backend():
+    '''Test error if an unknown backend is chosen'''
+    sudoku = np.zeros((9, 9), dtype=np.int8)
+    with pytest.raises(ValueError):
+        solve_sudoku(sudoku, backend='brute_force')
+
+
+def test_solve_sudoku_propagation():
+    '''Test if an easy sudoku puzzle is filled by the singles alone, with the same solution of the search'''
+    sudoku = [
+        [7, 5, 0, 0, 0, 0, 2, 0, 0],
+        [2, 6, 9, 0, 0, 7, 0, 0, 0],
+        [0, 3, 0, 0, 8, 9, 0, 0, 7],
+        [0, 0, 0, 6, 0, 2, 3, 8, 0],
+        [0, 0, 6, 0, 3, 0, 4, 0, 0],
+        [0, 9, 2, 8, 0, 4, 0, 0, 0],
+        [5, 0, 0, 9, 2, 0, 0, 6, 0],
+        [0, 0, 0, 3, 0, 0, 9, 2, 5],
+        [0, 0, 3, 0, 0, 0, 0, 1, 4]
+    ]
+    searched = np.copy(sudoku)
+    assert solve_sudoku(searched, propagate=False) == True, "Should be True"
+    techniques = {}
+    assert solve_sudoku(sudoku, techniques=techniques) == True, "Should be True"
+    assert (searched == sudoku).all(), "Should be the same solution"
+    assert techniques['naked_single'] + techniques['hidden_single'] == 48, "Should fill all the 48 empty cells"
+
+
+def test_solve_batch():
+    '''Test if a stack of a valid, an impossible and an empty sudoku puzzle is solved as by solve_sudoku'''
+    sudoku = [
+        [7, 5, 0, 0, 0, 0, 2, 0, 0],
+        [2, 6, 9, 0, 0, 7, 0, 0, 0],
+        [0, 3, 0, 0, 8, 9, 0, 0, 7],
+        [0, 0, 0, 6, 0, 2, 3, 8, 0],
+        [0, 0, 6, 0, 3, 0, 4, 0, 0],
+        [0, 9, 2, 8, 0, 4, 0, 0, 0],
+        [5, 0, 0, 9, 2, 0, 0, 6, 0],
+        [0, 0, 0, 3, 0, 0, 9, 2, 5],
+        [0, 0, 3, 0, 0, 0, 0, 1, 4]
+    ]
+    impossible_sudoku = [
+        [4, 0, 0, 6, 7, 0, 0, 8, 0],
+        [8, 1, 0, 3, 0, 0, 0, 2, 4],
+        [0, 0, 9, 0, 0, 1, 6, 0, 0],
+        [7, 9, 0, 5, 0, 0, 4, 0, 0],
+        [5, 0, 0, 0, 3, 0, 0, 0, 8],
+        [0, 0, 8, 0, 0, 2, 0, 7, 9],
+        [0, 0, 6, 7, 0, 0, 8, 0, 0],
+        [2, 7, 0, 0, 0, 4, 0, 9, 0],
+        [0, 8, 0, 0, 2, 3, 0, 0, 6]
+    ]
+    grids = np.array([sudoku, impossible_sudoku, np.zeros((9, 9))], dtype=np.int8)
+    solved, status = solve_batch(grids)
+    assert (status == [STATUS_SOLVED, STATUS_UNSOLVABLE, STATUS_SOLVED]).all(), "Should be solved, unsolvable, solved"
+    solve_sudoku(sudoku)
+    assert (solved[0] == sudoku).all(), "Should be the same solution of solve_sudoku"
+    assert (solved[1] == impossible_sudoku).all(), "Should be left as given"
+    for i in range(9):
+        for j in range(9):
+            assert check_sudoku(solved[2], solved[2][i][j], (i, j)) == True, "Should be True"
+
+
+def test_solve_batch_search():
+    '''Test if the puzzles that need guessing are searched together and solved or found unsolvable as by solve_sudoku'''
+    puzzles = load_tier('diabolical')
+    for puzzle in load_tier('diabolical'):
+        # fill the first empty cell with the lowest digit allowed by the givens, which often leaves the puzzle without solution
+        i, j = empty_position(puzzle)
+        puzzle[i][j] = next(number for number in range(1, 10) if check_sudoku(puzzle, number, (i, j)))
+        puzzles.append(puzzle)
+
+    solved, status = solve_batch(np.array(puzzles, np.int8))
+    assert STATUS_UNSOLVABLE in status, "Should have unsolvable puzzles"
+    for puzzle, solution, found in zip(puzzles, solved, status):
+        assert found == (STATUS_SOLVED if solve_sudoku(puzzle) else STATUS_UNSOLVABLE), "Should have the status of solve_sudoku"
+        assert (solution == puzzle).all(), "Should be the same solution of solve_sudoku or left as given"
+
+
+def test_count_solutions():
+    '''Test if the solutions of a sudoku are counted up to the limit, without changing the sudoku'''
+    sudoku = [
+        [7, 5, 0, 0, 0, 0, 2, 0, 0],
+        [2, 6, 9, 0, 0, 7, 0, 0, 0],
+        [0, 3, 0, 0, 8, 9, 0, 0, 7],
+        [0, 0, 0, 6, 0, 2, 3, 8, 0],
+        [0, 0, 6, 0, 3, 0, 4, 0, 0],
+        [0, 9, 2, 8, 0, 4, 0, 0, 0],
+        [5, 0, 0, 9, 2, 0, 0, 6, 0],
+        [0, 0, 0, 3, 0, 0, 9, 2, 5],
+        [0, 0, 3, 0, 0, 0, 0, 1, 4]
+    ]
+    given = np.copy(sudoku)
+    assert count_solutions(sudoku) == 1, "Should be 1"
+    assert has_unique_solution(sudoku) == True, "Should be True"
+    assert (given == sudoku).all(), "Should not be changed"
+    sudoku[1][2] = 0
+    assert count_solutions(sudoku, limit=10) == 2, "Should be 2"
+    assert count_solutions(np.zeros((9, 9), dtype=np.int8), limit=50, backend='dlx') == 50, "Should stop at 50"
+    assert has_unique_solution(np.zeros((9, 9), dtype=np.int8)) == False, "Should be False"
+
+
+def test_count_solutions_impossible():
+    '''Test if an impossible sudoku puzzle has no solutions'''
+    sudoku = [
+        [4, 0, 0, 6, 7, 0, 0, 8, 0],
+        [8, 1, 0, 3, 0, 0, 0, 2, 4],
+        [0, 0, 9, 0, 0, 1, 6, 0, 0],
+        [7, 9, 0, 5, 0, 0, 4, 0, 0],
+        [5, 0, 0, 0, 3, 0, 0, 0, 8],
+        [0, 0, 8, 0, 0, 2, 0, 7, 9],
+        [0, 0, 6, 7, 0, 0, 8, 0, 0],
+        [2, 7, 0, 0, 0, 4, 0, 9, 0],
+        [0, 8, 0, 0, 2, 3, 0, 0, 6]
+    ]
+    assert count_solutions(sudoku) == 0, "Should be 0"
+
+
+def hard_sudoku():
+    '''Return a hard sudoku puzzle that needs many guesses'''
+    return [
+        [8, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 3, 6, 0, 0, 0, 0, 0],
+        [0, 7, 0, 0, 9, 0, 2, 0, 0],
+        [0, 5, 0, 0, 0, 7, 0, 0, 0],
+        [0, 0, 0, 0, 4, 5, 7, 0, 0],
+        [0, 0, 0, 1, 0, 0, 0, 3, 0],
+        [0, 0, 1, 0, 0, 0, 0, 6, 8],
+        [0, 0, 8, 5, 0, 0, 0, 1, 0],
+        [0, 9, 0, 0, 0, 0, 4, 0, 0]
+    ]
+
+
+def test_solve_with_budget():
+    '''Test if a hard sudoku puzzle is solved within a large budget and the nodes are counted'''
+    sudoku = hard_sudoku()
+    status, stats = solve_with_budget(sudoku, max_nodes=100000, deadline=time.monotonic() + 60)
+    assert status == STATUS_SOLVED, "Should be STATUS_SOLVED"
+    assert 0 < stats.nodes <= 100000, "Should count the nodes"
+    assert all(check_sudoku(sudoku, sudoku[i][j], (i, j)) for i in range(9) for j in range(9)), "Should be True"
+
+    sudoku = hard_sudoku()
+    assert solve_with_budget(sudoku, max_nodes=100000, propagate=False)[0] == STATUS_SOLVED, "Should be STATUS_SOLVED"
+    assert all(check_sudoku(sudoku, sudoku[i][j], (i, j)) for i in range(9) for j in range(9)), "Should be True"
+    sudoku = [[3, 0, 1, 0], [1, 2, 0, 0], [0, 1, 0, 4], [2, 4, 3, 0]]
+    assert solve_with_budget(sudoku, propagate=False)[0] == STATUS_UNSOLVABLE, "Should be STATUS_UNSOLVABLE"
+    assert solve_sudoku(sudoku, 'propagation', propagate=False) == False, "Should be False"
+    assert sudoku == [[3, 0, 1, 0], [1, 2, 0, 0], [0, 1, 0, 4], [2, 4, 3, 0]], "Should not change the sudoku"
+    sudoku = [[0] * 9 for _ in range(9)]
+    sudoku[0] = [0, 2, 3, 4, 5, 6, 7, 8, 9]
+    sudoku[1][0] = 1
+    assert solve_sudoku(sudoku, 'propagation', propagate=False) == False, "Should be False"
+
+
+def test_solve_with_budget_exhausted():
+    '''Test if the search stops after max_nodes nodes or after the deadline without changing the sudoku'''
+    sudoku = hard_sudoku()
+    status, stats = solve_with_budget(sudoku, max_nodes=5)
+    assert status == STATUS_BUDGET_EXHAUSTED, "Should be STATUS_BUDGET_EXHAUSTED"
+    assert stats.nodes == 5, "Should be 5"
+    assert sudoku == hard_sudoku(), "Should not change the sudoku"
+    assert solve_with_budget(sudoku, deadline=time.monotonic() - 1)[0] == STATUS_BUDGET_EXHAUSTED, "Should be STATUS_BUDGET_EXHAUSTED"
+
+
+def test_solve_with_budget_cancelled():
+    '''Test if the search stops when the cancellation event is set and reports an impossible sudoku'''
+    cancel = threading.Event()
+    cancel.set()
+    assert solve_with_budget(hard_sudoku(), cancel=cancel)[0] == STATUS_CANCELLED, "Should be STATUS_CANCELLED"
+    sudoku = hard_sudoku()
+    sudoku[0][1] = 8
+    assert solve_with_budget(sudoku)[0] == STATUS_UNSOLVABLE, "Should be STATUS_UNSOLVABLE"
+
+
+def test_solver_stats():
+    '''Test if every backend records its work on the same puzzle and every empty cell is filled by propagation or by a guess'''
+    empty = sum(value == 0 for line in hard_sudoku() for value in line)
+    for backend in ('bitmask', 'dlx', 'propagation'):
+        stats = SolverStats()
+        assert solve_sudoku(hard_sudoku(), backend, stats=stats) == True, "Should be True"
+        assert stats.backend == backend, "Should record the backend"
+        assert stats.nodes > stats.max_depth > 0, "Should count the nodes"
+        assert stats.backtracks > 0, "Should count the backtracks"
+        assert stats.propagated + stats.searched == empty, "Should split the empty cells"
+        assert stats.wall_time > 0 and stats.cpu_time > 0, "Should measure the time"
+    stats = SolverStats()
+    assert count_solutions(hard_sudoku(), stats=stats) == 1, "Should be 1"
+    assert stats.nodes > 0, "Should count the nodes"
+
+
+def test_solve_sudoku_steps():
+    '''Test if the generator yields partial grids with growing stats, returns True with the solution and leaves the sudoku unchanged when it is closed'''
+    sudoku = hard_sudoku()
+    steps = solve_sudoku_steps(sudoku, steps=5)
+    nodes = yields = 0
+    try:
+        while True:
+            partial, stats = next(steps)
+            assert all(partial[i][j] == value for i, line in enumerate(hard_sudoku()) for j, value in enumerate(line) if value), "Should keep the givens"
+            assert stats.nodes > nodes, "Should count more nodes"
+            nodes = stats.nodes
+            yields += 1
+    except StopIteration as done:
+        assert done.value == True, "Should be True"
+    assert yields > 0, "Should yield at least once"
+    assert all(check_sudoku(sudoku, sudoku[i][j], (i, j)) for i in range(9) for j in range(9)), "Should be a valid solution"
+
+    sudoku = hard_sudoku()
+    steps = solve_sudoku_steps(sudoku, steps=5)
+    next(steps)
+    steps.close()
+    assert sudoku == hard_sudoku(), "Should leave the sudoku unchanged"
+
+    for sudoku, expected in ((hard_sudoku(), True), ([[3, 0, 1, 0], [1, 2, 0, 0], [0, 1, 0, 4], [2, 4, 3, 0]], False)):
+        steps = solve_sudoku_steps(sudoku, steps=5, propagate=False)
+        try:
+            while True:
+                next(steps)
+        except StopIteration as done:
+            assert done.value == expected, f"Should be {expected}"
+    assert sudoku == [[3, 0, 1, 0], [1, 2, 0, 0], [0, 1, 0, 4], [2, 4, 3, 0]], "Should not change the sudoku"
+
+    # with limit=2 the generator returns the number of solutions and fills the sudoku with the first one
+    for sudoku, expected in ((hard_sudoku(), 1), ([[0] * 9 for _ in range(9)], 2), ([[3, 0, 1, 0], [1, 2, 0, 0], [0, 1, 0, 4], [2, 4, 3, 0]], 0)):
+        steps = solve_sudoku_steps(sudoku, steps=5, limit=2)
+        try:
+            while True:
+                next(steps)
+        except StopIteration as done:
+            assert done.value == expected, f"Should be {expected}"
+        if expected:
+            assert all(check_sudoku(sudoku, sudoku[i][j], (i, j)) for i in range(9) for j in range(9)), "Should be a valid solution"
+
+
+######################################################################################################
+## tests for sudoku_bulk_solver.py
+
+# ====================================================================================================
+# UNIT TESTING
+# ====================================================================================================
+
+def test_solve_lines_order():
+    '''Test if the solutions of a puzzle file are written in the input order, with dots for unsolvable or malformed lines'''
+    lines = [
+        "75....2..269..7....3..89..7...6.238...6.3.4...928.4...5..92..6....3..925..3....14\n",
+        "4..67..8..1.3...249...16..794.5..4..5...3...8..8..2.79..67..8..27...4.9..8..23..6\n",
+        "not a sudoku\n",
+        "................................................................................."
+    ]
+    solutions = list(solve_lines(lines + ["\u0661" * 81], workers=2, chunk_size=1))
+    assert len(solutions) == 5 and solutions.pop() == '.' * 81, "Should be malformed"
+    assert solutions[0] == "758163249269457138134289657475692381816735492392814576541928763687341925923576814", "Should be the solution"
+    assert solutions[1] == '.' * 81 and solutions[2] == '.' * 81, "Should be unsolvable"
+    sudoku = np.array([int(digit) for digit in solutions[3]]).reshape(9, 9)
+    for i in range(9):
+        for j in range(9):
+            assert check_sudoku(sudoku, sudoku[i][j], (i, j)) == True, "Should be True"
+
+
+def test_solve_file_malformed_bytes(tmp_path):
+    '''Test if a line with bytes that are not text is written as dots and the other lines are solved'''
+    path = tmp_path / "puzzles.txt"
+    path.write_bytes(b"\xff" * 81 + b"\n" + b"75....2..269..7....3..89..7...6.238...6.3.4...928.4...5..92..6....3..925..3....14\n")
+    assert solve_file(str(path), str(tmp_path / "solutions.txt"), workers=1) == (1, 1), "Should be 1 solved and 1 unsolvable"
+    assert (tmp_path / "solutions.txt").read_text().splitlines()[0] == '.' * 81, "Should be malformed"
+
+
+def test_solve_file_packed(tmp_path):
+    '''Test if a packed grid file is solved to a packed file in the input order, with an unsolvable grid written as zeros'''
+    puzzles = np.array(load_tier('easy')[:5], np.uint8)
+    puzzles[4, 0, :2] = 5
+    with GridWriter(str(tmp_path / "puzzles.bin"), 'packed') as writer:
+        writer.write(puzzles)
+    assert solve_file(str(tmp_path / "puzzles.bin"), str(tmp_path / "solutions.bin"), workers=1, chunk_size=2) == (4, 1), "Should be (4, 1)"
+
+    solutions = np.concatenate(list(read_grids(str(tmp_path / "solutions.bin"))))
+    assert solutions.shape == (5, 9, 9), "Should be (5, 9, 9)"
+    assert ((puzzles[:4] == 0) | (puzzles[:4] == solutions[:4])).all(), "Should keep the given digits"
+    assert (solutions[:4].sum(axis=2) == 45).all() and not solutions[4].any(), "Should be solved or empty"
+
+
+######################################################################################################
+## tests for sudoku_benchmark.py
+######################################################################################################
+
+
+def test_load_tier():
+    '''Test if every tier of the corpus is read as 9x9 puzzles and the minimal tier has 17 givens'''
+    for tier in TIERS:
+        puzzles = load_tier(tier)
+        assert len(puzzles) > 0, "Should not be empty"
+        assert all(len(puzzle) == 9 and all(len(line) == 9 for line in puzzle) for puzzle in puzzles), "Should be 9x9"
+    assert all(sum(value != 0 for line in puzzle for value in line) == 17 for puzzle in load_tier('seventeen')), "Should be 17"
+
+
+def test_run_suite():
+    '''Test if the suite reports sorted percentiles for an entry point on a tier'''
+    results = run_suite(('easy',), ['solve_sudoku[bitmask]'], repeat=1)
+    assert len(results) == 1, "Should be 1"
+    row = results[0]
+    assert row['puzzles'] == len(load_tier('easy')), "Should time every puzzle"
+    assert 0 < row['p50_ms'] <= row['p95_ms'] <= row['max_ms'], "Should be sorted"
+
+
+def test_compare_to_baseline():
+    '''Test if only the metrics that grew more than the tolerance are reported'''
+    baseline = {'results': [{'entry_point': 'solve_batch', 'tier': 'easy', 'p50_ms': 1.0, 'p95_ms': 2.0, 'nodes': 10}]}
+    results = [{'entry_point': 'solve_batch', 'tier': 'easy', 'p50_ms': 1.2, 'p95_ms': 3.0, 'nodes': 10},
+               {'entry_point': 'solve_batch', 'tier': 'seventeen', 'p50_ms': 9.0, 'p95_ms': 9.0, 'nodes': 10}]
+    regressions = compare_to_baseline(results, baseline, tolerance=0.25)
+    assert len(regressions) == 1 and 'p95_ms' in regressions[0], "Should report the p95 only"
+
+
+######################################################################################################
+## tests for sudoku_cache.py
+######################################################################################################
+
+
+def equivalent_sudoku():
+    '''Return the hard sudoku puzzle transposed, with the first two bands swapped and the digits relabeled'''
+    labels = [0, 3, 1, 4, 9, 5, 2, 6, 8, 7]
+    sudoku = hard_sudoku()
+    sudoku = sudoku[3:6] + sudoku[0:3] + sudoku[6:9]
+    return [[labels[value] for value in line] for line in zip(*sudoku)]
+
+
+def test_canonical_form_equivalent():
+    '''Test if equivalent sudoku puzzles have the same canonical form and different ones do not'''
+    assert canonical_form(hard_sudoku())[0] == canonical_form(equivalent_sudoku())[0], "Should be equal"
+    other = hard_sudoku()
+    other[0][0] = 0
+    assert canonical_form(hard_sudoku())[0] != canonical_form(other)[0], "Should be different"
+
+
+def test_solution_cache():
+    '''Test if an equivalent sudoku puzzle is solved from the cache keeping its given digits'''
+    cache = SolutionCache()
+    assert cache.solve(hard_sudoku()) == True, "Should be True"
+    sudoku = equivalent_sudoku()
+    assert cache.solve(sudoku) == True, "Should be True"
+    assert (cache.hits, cache.misses) == (1, 1), "Should be a hit"
+    assert all(check_sudoku(sudoku, sudoku[i][j], (i, j)) for i in range(9) for j in range(9)), "Should be True"
+    assert all(given in (0, value) for a, b in zip(equivalent_sudoku(), sudoku) for given, value in zip(a, b)), "Should keep the given digits"
+
+
+def test_solution_cache_disk(tmp_path):
+    '''Test if the solutions are kept in the SQLite file across caches and the file is bounded'''
+    path = str(tmp_path / "solutions.db")
+    puzzles = [random_puzzle(9, 0.4, random.Random(seed)) for seed in range(6)]
+    cache = SolutionCache(path=path, max_disk_entries=4)
+    for puzzle in puzzles:
+        cache.solve([line[:] for line in puzzle])
+    assert cache.disk_entries <= 4, "Should evict the oldest solutions"
+    cache.close()
+
+    cache = SolutionCache(path=path, max_disk_entries=4)
+    assert cache.solve([line[:] for line in puzzles[-1]]) == True, "Should be True"
+    assert (cache.disk_hits, cache.misses) == (1, 0), "Should be read from the file"
+    cache.close()
+
+
+######################################################################################################
+## tests for sudoku_generator.py
+######################################################################################################
+
+
+def test_generate_puzzle():
+    '''Test if the generated puzzles have a unique solution and the requested number of given digits'''
+    rng = random.Random(0)
+    for clues in (36, 30):
+        puzzle = generate_puzzle(clues, rng=rng)
+        assert sum(value != 0 for line in puzzle for value in line) == clues, "Should be " + str(clues)
+        assert count_solutions(puzzle) == 1, "Should be 1"
+    puzzle = generate_puzzle(8, size=4, rng=rng)
+    assert count_solutions(puzzle) == 1, "Should be 1"
+
+
+def test_grade_puzzle():
+    '''Test if the puzzles of the easy and diabolical tiers of the corpus are graded as such, also when transformed'''
+    assert all(grade_puzzle(puzzle) == 'easy' for puzzle in load_tier('easy')), "Should be easy"
+    assert all(grade_puzzle(transform_puzzle(puzzle, random.Random(1))) == 'diabolical' for puzzle in load_tier('diabolical')), "Should be diabolical"
+    puzzle = generate_puzzle(34, 'easy', rng=random.Random(2))
+    assert grade_puzzle(puzzle) == 'easy', "Should be easy"
+
+
+def test_generate_puzzles_repeatable():
+    '''Test if the same seed generates the same puzzles and every variant is equivalent to the puzzle before it'''
+    puzzles = list(generate_puzzles(6, 34, workers=1, seed=3, variants=3, chunk_size=4))
+    assert puzzles == list(generate_puzzles(6, 34, workers=1, seed=3, variants=3, chunk_size=4)), "Should be repeatable"
+    assert len(puzzles) == 6, "Should be 6"
+    assert canonical_form(puzzles[0])[0] == canonical_form(puzzles[2])[0], "Should be equivalent"
+
+
+######################################################################################################
+## tests for sudoku_format.py
+######################################################################################################
+
+
+def test_pack_grids():
+    '''Test if packing and unpacking a stack of grids gives back the same grids in 41 bytes each'''
+    grids = np.random.default_rng(0).integers(0, 10, (7, 9, 9)).astype(np.uint8)
+    packed = pack_grids(grids)
+    assert packed.shape == (7, 41), "Should be (7, 41)"
+    assert (unpack_grids(packed) == grids).all(), "Should be equal"
+    assert (grid_from_bytes(grid_to_bytes(grids[0])) == grids[0]).all(), "Should be equal"
+    assert (grid_from_bytes('.' * 81) == 0).all(), "Should be empty"
+
+
+def test_read_grids_formats(tmp_path):
+    '''Test if the grids written in every format are read back in chunks, the raw ones without copies'''
+    grids = np.random.default_rng(1).integers(0, 10, (10, 9, 9)).astype(np.uint8)
+    for fmt in ('text', 'raw', 'packed'):
+        path = str(tmp_path / ("grids." + fmt))
+        with GridWriter(path, fmt) as writer:
+            writer.write(grids[:4])
+            writer.write(grids[4:])
+        chunks = list(read_grids(path, chunk_size=3))
+        assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1], "Should be chunks of 3"
+        assert (np.concatenate(chunks) == grids).all(), "Should be equal"
+        if fmt == 'raw':
+            assert isinstance(chunks[0].base, np.memmap) or isinstance(chunks[0], np.memmap), "Should be a view of the file"
+
+
+def test_read_grids_text_lines(tmp_path):
+    '''Test if the text files with CRLF endings or without the last line ending are read and the ones with other lines are refused'''
+    grids = np.random.default_rng(2).integers(0, 10, (5, 9, 9)).astype(np.uint8)
+    lines = [grid_to_bytes(grid) for grid in grids]
+    path = tmp_path / "grids.txt"
+    for data in (b'\n'.join(lines), b'\r\n'.join(lines) + b'\r\n', b'\r\n'.join(lines), lines[0]):
+        path.write_bytes(data)
+        read = np.concatenate(list(read_grids(str(path), chunk_size=2)))
+        assert (read == grids[:len(read)]).all() and len(read) == (1 if data == lines[0] else 5), "Should read every line"
+    for data in (b'\n'.join(lines[:2] + [lines[2] + b'1', lines[3][1:]] + lines[4:]) + b'\n', b'\n'.join(lines[:2] + [lines[2][:80] + b'\n' + lines[3][1:]]) + b'\n',
+                 b'\r\n'.join(lines[:2]) + b'\n' + b'\r\n'.join(lines[2:])):
+        path.write_bytes(data)
+        with pytest.raises(ValueError):
+            list(read_grids(str(path)))
+
+
+######################################################################################################
+## tests for sudoku_bulk_extraction.py
+######################################################################################################
+
+
+def test_extract_images(tmp_path):
+    '''Test if a batch of images is extracted by a pool of processes with the status of every image, in order or as they are ready'''
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b'not an image')
+    paths = list_images(["icon_and_demo_images/images_for_testing", str(broken)])
+    assert [path.split('/')[-1] for path in paths] == ["not_sudoku.PNG", "sudoku_16.jpg", "sudoku_hand_15.JPG", "broken.jpg"], "Should list the images"
+
+    model_name = "sudoku_model/model_sudoku.hdf5"
+    results = list(extract_images(paths, model_name, workers=2))
+    assert [result['path'] for result in results] == paths, "Should keep the order"
+    assert [result['status'] for result in results] == ['no_grid', 'ok', 'ok', 'error'], "Should be the status of every image"
+    grid = extrapolate_sudoku(paths[1], model_name)
+    assert results[1]['grid'] == ''.join(str(value) for value in grid.ravel()), "Should be the same puzzle"
+    assert set(results[1]['timings']) == set(STAGES) and results[1]['seconds'] > 0, "Should time every stage"
+
+    unordered = list(extract_images(paths, model_name, workers=2, ordered=False))
+    assert sorted(result['path'] for result in unordered) == sorted(paths), "Should extract every image"
+
+
+######################################################################################################
+## tests for sudoku_model_registry.py
+######################################################################################################
+
+
+def test_model_registry(tmp_path):
+    '''Test if the registry loads a model once, reloads it when its file changes and evicts the least recently used one'''
+    loaded = []
+    registry = ModelRegistry(max_models=2, loader=lambda path: loaded.append(path) or object())
+    paths = [str(tmp_path / f"model_{k}.hdf5") for k in range(3)]
+    for path in paths:
+        with open(path, 'w') as file:
+            file.write('model')
+
+    first = registry.get(paths[0])
+    assert registry.get(paths[0]) is first, "Should be the same model"
+    assert (registry.hits, registry.misses) == (1, 1), "Should be 1 hit and 1 miss"
+    with open(paths[0], 'w') as file:
+        file.write('new model')
+    assert registry.get(paths[0]) is not first, "Should load the changed file"
+
+    registry.get(paths[1])
+    registry.get(paths[2])
+    assert len(registry) == 2 and registry.evictions == 1, "Should evict the first model"
+    assert registry.unload(paths[1]) == 1 and registry.unload(paths[0]) == 0, "Should unload only the loaded model"
+    assert registry.unload() == 1 and len(registry) == 0, "Should be empty"
+    assert len(loaded) == 4, "Should load 4 times"
+    with pytest.raises(IOError):
+        registry.get(str(tmp_path / "missing.hdf5"))
+
+
+######################################################################################################
+## tests for sudoku_numpy_model.py
+######################################################################################################
+
+
+def test_numpy_layers():
+    '''Test the convolution and the pooling against loops over the pixels'''
+    rng = np.random.default_rng(0)
+    x = rng.random((2, 6, 5, 3), np.float32)
+    kernel = rng.random((3, 3, 3, 4), np.float32)
+    bias = rng.random(4, np.float32)
+    expected = np.zeros((2, 4, 3, 4), np.float32)
+    for i in range(4):
+        for j in range(3):
+            expected[:, i, j] = np.tensordot(x[:, i:i + 3, j:j + 3], kernel, axes=3) + bias
+    assert np.allclose(conv2d(x, kernel, bias), expected, atol=1e-5), "Should be the valid convolution"
+    assert conv2d(x, kernel, bias, 'same').shape == (2, 6, 5, 4), "Should keep the size of the image"
+    assert np.allclose(conv2d(x, kernel, bias, 'same')[:, 1:5, 1:4], expected, atol=1e-5), "Should be the same inside the image"
+    assert (max_pool2d(x) == x[:, :6, :4].reshape(2, 3, 2, 2, 2, 3).max(axis=(2, 4))).all(), "Should be the maximum of every block"
+
+
+def test_numpy_model():
+    '''Test if the NumPy engine gives the outputs of Keras for both models and the same puzzles'''
+    for model_name in ("sudoku_model/model_sudoku.hdf5", "sudoku_model/model_sudoku_mnist.hdf5"):
+        batch = np.random.default_rng(0).integers(0, 256, (32, 28, 28, 1)).astype(np.float32)
+        expected = registry('keras').get(model_name).predict(batch, verbose=0)
+        output = load_numpy_model(model_name).predict(batch)
+        assert np.abs(output - expected).max() < 1e-3, "Should be the output of Keras"
+        assert (output.argmax(axis=1) == expected.argmax(axis=1)).all(), "Should be the same digits"
+
+    sudoku_image = "icon_and_demo_images/images_for_testing/sudoku_hand_15.JPG"
+    model_name = "sudoku_model/model_sudoku_mnist.hdf5"
+    assert (extrapolate_sudoku(sudoku_image, model_name, 'numpy') == extrapolate_sudoku(sudoku_image, model_name, 'keras')).all(), "Should be the same puzzle"
+    with pytest.raises(ValueError):
+        ExtractionPipeline(model_name, backend='torch')
+
+
+######################################################################################################
+## tests for sudoku_model_export.py
+######################################################################################################
+
+
+def test_export_model(tmp_path):
+    '''Test if the inference-only models are smaller, keep the puzzles and are checked against their content hash'''
+    import h5py
+    model_name = "sudoku_model/model_sudoku.hdf5"
+    sudoku_image = "icon_and_demo_images/images_for_testing/sudoku_16.jpg"
+    calibration, counts = digit_images([sudoku_image])
+    assert counts == [len(calibration)] and calibration.shape[1:] == (28, 28), "Should be the digits of the image"
+    sudoku = extrapolate_sudoku(sudoku_image, model_name)
+
+    paths = {}
+    for dtype in ('float32', 'float16', 'int8'):
+        paths[dtype] = str(tmp_path / f"model_{dtype}.hdf5")
+        metadata = export_model(model_name, paths[dtype], dtype, calibration)
+        assert read_metadata(paths[dtype]) == dict(read_metadata(paths[dtype]), **metadata), "Should store the metadata"
+        with h5py.File(paths[dtype], 'r') as file:
+            assert 'optimizer_weights' not in file and 'training_config' not in file.attrs, "Should not store the training state"
+        assert (extrapolate_sudoku(sudoku_image, paths[dtype]) == sudoku).all(), "Should be the same puzzle"
+    assert os.path.getsize(paths['int8']) < os.path.getsize(paths['float16']) < os.path.getsize(paths['float32']) < os.path.getsize(model_name)
+    assert (load_numpy_model(paths['float32']).predict(calibration) == load_numpy_model(model_name).predict(calibration)).all()
+    assert read_metadata(model_name) == {}, "Should not be an inference-only model"
+
+    rows = compare_models(model_name, [paths['int8']], [sudoku_image], repeat=1)
+    assert [row['model'] for row in rows] == ["model_sudoku.hdf5", "model_int8.hdf5"] and rows[1]['grids'] == '1/1'
+    with pytest.raises(ValueError):
+        export_model(model_name, str(tmp_path / "model.hdf5"), 'int8')
+    with h5py.File(paths['float16'], 'r+') as file:
+        file['model_weights/dense/dense/bias:0'][0] += 1
+    with pytest.raises(ValueError):
+        load_numpy_model(paths['float16'])
+
+
 ######################################################################################################
 ## tests for sudoku_extrapolation.py
 
@@ -311,6 +1016,142 @@ def test_extrapolate_empty_image():
     assert (extrapolate_sudoku(sudoku_image, model_name) == sudoku).all(), "Should be an empty array"
 
 
+def test_extraction_pipeline():
+    '''Test if the pipeline times every stage, stops after a stage and reuses the intermediates of a previous run'''
+    sudoku_image = "icon_and_demo_images/images_for_testing/sudoku_16.jpg"
+    called = []
+    pipeline = ExtractionPipeline("sudoku_model/model_sudoku.hdf5", callbacks=[lambda stage, seconds, state: called.append(stage)])
+    state = pipeline.run(sudoku_image, stop_after='locate_grid')
+    assert called == list(STAGES[:4]) and list(pipeline.timings) == called, "Should run the first 4 stages"
+    assert 'grid' not in state and state['homography'].shape == (3, 3), "Should stop after locating the grid"
+
+    full = pipeline.run(state=state)
+    assert list(pipeline.timings) == list(STAGES[4:]), "Should run only the remaining stages"
+    reused = pipeline.run(sudoku_image, state={'homography': state['homography']})
+    assert 'locate_grid' not in pipeline.timings, "Should reuse the homography"
+    assert (reused['sudoku_grid'] == full['sudoku_grid']).all(), "Should be the same puzzle"
+    assert (reused['grid'] == full['grid']).all(), "Should warp the same grid from the homography alone"
+    assert (full['sudoku_grid'] == extrapolate_sudoku(sudoku_image, "sudoku_model/model_sudoku.hdf5")).all(), "Should be the same puzzle"
+
+
+def test_extrapolate_in_memory_image():
+    '''Test if the same puzzle is extracted from the path, the bytes, the file object and the decoded arrays of an image'''
+    import cv2
+    sudoku_image = "icon_and_demo_images/images_for_testing/sudoku_16.jpg"
+    model_name = "sudoku_model/model_sudoku.hdf5"
+    sudoku = extrapolate_sudoku(sudoku_image, model_name)
+    with open(sudoku_image, 'rb') as file:
+        data = file.read()
+        file.seek(0)
+        assert (extrapolate_sudoku(file, model_name) == sudoku).all(), "Should be the same puzzle"
+    assert (extrapolate_sudoku(data, model_name) == sudoku).all(), "Should be the same puzzle"
+    assert (extrapolate_sudoku(cv2.imread(sudoku_image), model_name) == sudoku).all(), "Should be the same puzzle"
+    assert (extrapolate_sudoku(cv2.imread(sudoku_image, 0), model_name) == sudoku).all(), "Should be the same puzzle"
+
+
+# the grids extracted from sudoku_test_images by the original extraction, before the pipeline was optimized
+ORIGINAL_GRIDS = {
+    "model_sudoku.hdf5": {
+        "sudoku_11.jpg": "000604980003980605090300041534100002060050030100003576350008060409016300072509000",
+        "sudoku_13.JPG": "200906000069708100057000060430020071000401000170080096040000980003107640000803007",
+        "sudoku_16.jpg": "600700021020300704003100050847030000000618000000040938070002100309001070260003009",
+        "sudoku_18.jpg": "489200006130600000706010800850700000002080300000009018003070401000006082900002563",
+        "sudoku_19.jpg": "307065000020090300400000670000409007270050049800207000032000004006020010000640903",
+        "sudoku_2.jpg": "008200006000090000602847900509102400047050210006904305005419603000060000400003800",
+        "sudoku_21.JPG": "346400040400006944404003440900004490000040000044400004093400404416400004040004614",
+        "sudoku_24.jpg": "807039000000780100205400070078300005390000081600008230020007308009023000000950702",
+        "sudoku_38.jpg": "060050009100400600009006050040500200300070004007004080010800700008003002900060010",
+        "sudoku_hand_15.JPG": "040105039630078165105603760500316470660520013013860056006731589876652151351384627",
+        "sudoku_hand_32.JPG": "316785200273156008896135007125654783675978612748321453481800076512507900597410800",
+        "sudoku_hand_36.JPG": "812456331665317582713534496180700059530050026560009013398165267124678535675933148",
+    },
+    "model_sudoku_mnist.hdf5": {
+        "sudoku_11.jpg": "000604980003980605090300041534100002060050030100003576350008060409016300072509000",
+        "sudoku_13.JPG": "200906000069708100057000060430020071000401000170080096040000980003107640000803007",
+        "sudoku_16.jpg": "600700021020300704003100050847030000000618000000040938070002100309001070260003009",
+        "sudoku_18.jpg": "489200006130600000706010800850700000002080300000009018003070401000006082900002563",
+        "sudoku_19.jpg": "307065000020090300400000670000409007270050049800207000032000004006020010000640903",
+        "sudoku_2.jpg": "008200006000090000602847900509102400047050210006904305005419603000060000400003800",
+        "sudoku_21.JPG": "002200090900007222202000000200000070000090000092900002020200200000000009020000790",
+        "sudoku_24.jpg": "807039000000780100205400070078300005390000081600008230020007308009023000000950702",
+        "sudoku_38.jpg": "060050009100400600009006050040500200300070004007004080010800700008003002900060010",
+        "sudoku_hand_15.JPG": "040105039630078145105403760500316470460520013013840056006731584874652391351984627",
+        "sudoku_hand_32.JPG": "516789200273146008894235007129654783635978412748321659451800076382507900967410800",
+        "sudoku_hand_36.JPG": "852496371469317582713582496280700059930050024540009013398145267124678935675923148",
+    },
+}
+
+
+def test_extrapolation_original_grids():
+    '''Test if the grids of all the test images decoded at full size are the ones of the original extraction, for both models,
+    and if the grids read without conflicts stay the same when the large photos are decoded at a reduced size'''
+    for model_name, grids in ORIGINAL_GRIDS.items():
+        full = ExtractionPipeline(f"sudoku_model/{model_name}", decode_margin=None)
+        reduced = ExtractionPipeline(f"sudoku_model/{model_name}")
+        for image, grid in grids.items():
+            sudoku = full.run(f"sudoku_test_images/{image}")['sudoku_grid']
+            assert ''.join(str(value) for value in sudoku.ravel()) == grid, f"Should be the original grid of {image}"
+            if not find_conflicts(sudoku.tolist()):
+                sudoku = reduced.run(f"sudoku_test_images/{image}")['sudoku_grid']
+                assert ''.join(str(value) for value in sudoku.ravel()) == grid, f"Should be the original grid of {image}"
+
+
+def test_localize_digits_filtered():
+    '''Test if the components filtered by their stats give the digits of the contour search over every component of the cells'''
+    import cv2
+    pipeline = ExtractionPipeline()
+    for image in sorted(os.listdir("sudoku_test_images")):
+        state = pipeline.run(f"sudoku_test_images/{image}", stop_after='localize_digits')
+        expected, digits = [], []
+        for i in range(9):
+            for j in range(9):
+                im = state['cells'][i][j]
+                num_labels, labels = cv2.connectedComponents(im)
+                digit_contour = None
+                for k in range(num_labels):
+                    contours, hierarchy = cv2.findContours(cv2.compare(labels, k, cv2.CMP_EQ), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                    for c in contours:
+                        if len(c) >= 8 and (((c.reshape(-1, 2) - 14) ** 2).sum(axis=1) < 36).any():
+                            digit_contour = c
+                if digit_contour is not None:
+                    x, y, w, h = cv2.boundingRect(digit_contour)
+                    if np.count_nonzero(im[y:y + h, x:x + w] == 255) >= 5:
+                        expected.append((i, j))
+                        digit = np.zeros((28, 28), np.uint8)
+                        digit[(28 - h) // 2:(28 - h) // 2 + h, (28 - w) // 2:(28 - w) // 2 + w] = im[y:y + h, x:x + w]
+                        digits.append(digit)
+        assert state['digit_cells'] == expected, f"Should find the same digits in {image}"
+        assert (state['mnist_images'] == np.array(digits).reshape(-1, 28, 28)).all(), f"Should crop the same digits in {image}"
+
+
+def test_orient_image():
+    '''Test if an image array is turned for every EXIF orientation as PIL turns the images shown in the GUI'''
+    from PIL import Image, ImageOps
+    array = np.arange(12, dtype=np.uint8).reshape(3, 4)
+    for orientation in range(1, 9):
+        image = Image.fromarray(array)
+        exif = image.getexif()
+        exif[274] = orientation
+        image.info['exif'] = exif.tobytes()
+        expected = np.asarray(ImageOps.exif_transpose(image))
+        assert (orient_image(array, orientation) == expected).all(), f"Should turn the image for orientation {orientation}"
+
+
+def test_decode_factor():
+    '''Test if an image is decoded at a reduced size only when it stays large enough'''
+    assert decode_factor((4032, 3024)) == 4, "Should be 4"
+    assert decode_factor((4032, 3024), margin=2) == 1, "Should be 1"
+    assert decode_factor((4032, 3024), margin=None) == 1, "Should be 1"
+    assert decode_factor((4032, 3024), margin=1) == 2, "Should be 2"
+    assert decode_factor((8064, 6048), margin=2) == 2, "Should be 2"
+    assert decode_factor((16128, 12096), margin=1) == 8, "Should be 8"
+    assert decode_factor((419, 358)) == 1, "Should be 1"
+
+    # a 12 MP photo goes through the reduced decode by default
+    state = ExtractionPipeline().run("sudoku_test_images/sudoku_hand_15.JPG", stop_after='decode')
+    assert state['decode_factor'] == 4 and sorted(state['image'].shape) == [756, 1008], "Should decode at 1/4"
+
+
 def test_extrapolate_no_model():
     '''Test error if is given an empty model path'''
     sudoku_image = "icon_and_demo_images/images_for_testing/sudoku_hand_15.JPG"